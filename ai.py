@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import random
+from math import pi, atan2
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from simulation import PoolSimulation, simulate_shot
+
+
+def evaluate_shots(state, shots, max_steps, deadline=None):
+    # deadline is a time.time() value, the clock worker processes share.
+    # A shot that would likely end past it, taking the last one as a
+    # guess, is skipped so the batch gets back in time.
+    base = state.snapshot()
+    scratch = state.copy()
+    results = []
+    now = time.time()
+    shot_time = 0
+    for angle, force in shots:
+        if deadline is not None and now + shot_time >= deadline:
+            break
+        scratch.restore(base)
+        _, events = simulate_shot(scratch, angle, force, max_steps, in_place=True)
+        results.append((score_shot(events), angle, force))
+        shot_time = time.time() - now
+        now += shot_time
+    return results
+
+
+def score_shot(events):
+    # Pocketing an opponent's ball is what keeps the turn and knocks
+    # players out; pocketing your own ball or the main ball is a loss.
+    turn = events[-1]
+    player = turn['player']
+    score = 0
+    for event in events:
+        if event['type'] == 'goal':
+            score += 1 if event['owner'] != player else -1.5
+    if turn['scratch']:
+        score -= 1
+    if turn['winner'] == player:
+        score += 100
+    return score
+
+
+class ShotPlanner:
+    def __init__(self, time_budget=1.0, workers=None, batch_size=8, min_force=60, max_force=300, max_steps=3000, seed=None):
+        self.time_budget = time_budget
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.min_force = min_force
+        self.max_force = max_force
+        self.max_steps = max_steps
+        self.random = random.Random(seed)
+        self.executor = None
+        self.best = None
+        self.evaluated = 0
+        self.elapsed = 0
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def sample(self, state):
+        # Half of the candidates aim straight at an opponent's ball with a
+        # little noise, the rest are spread over the whole table.
+        main_ball = state.main_ball
+        player = state.active_player()
+        targets = [ball for ball in state.balls if ball.owner != player and ball.owner != "house"]
+        force = self.random.uniform(self.min_force, self.max_force)
+        if targets and self.random.random() < 0.5:
+            target = self.random.choice(targets)
+            angle = atan2(target.y - main_ball.y, target.x - main_ball.x) + self.random.gauss(0, 0.05)
+        else:
+            angle = self.random.uniform(-pi, pi)
+        return angle, force
+
+    def plan(self, state):
+        self.start()
+        state = state.copy()
+        start = time.perf_counter()
+        deadline = start + self.time_budget
+        shared_deadline = time.time() + self.time_budget
+        self.best = (-float('inf'), 0, self.max_force)
+        self.evaluated = 0
+        running = set()
+        while time.perf_counter() < deadline:
+            while len(running) < 2 * self.workers:
+                shots = [self.sample(state) for _ in range(self.batch_size)]
+                running.add(self.executor.submit(evaluate_shots, state, shots, self.max_steps, shared_deadline))
+            done, running = wait(running, timeout=max(deadline - time.perf_counter(), 0), return_when=FIRST_COMPLETED)
+            self.collect(done)
+        # Batches still running stop at the shared deadline on their own;
+        # their last shots are not worth waiting for.
+        for future in running:
+            future.cancel()
+        self.collect([future for future in running if future.done()])
+        self.elapsed = time.perf_counter() - start
+        return self.best[1], self.best[2]
+
+    def collect(self, futures):
+        for future in futures:
+            if not future.cancelled():
+                results = future.result()
+                self.evaluated += len(results)
+                self.best = max([self.best] + results)
+
+    def shots_per_second(self):
+        return self.evaluated / self.elapsed if self.elapsed else 0
+
+
+def benchmark(seconds=3.0, player_number=2, core_counts=None):
+    state = PoolSimulation()
+    state.rack(player_number)
+    cores = os.cpu_count() or 1
+    if core_counts is None:
+        core_counts = sorted({1, 2, 4, 8, 16, cores} & set(range(1, cores + 1)))
+    for workers in core_counts:
+        planner = ShotPlanner(time_budget=0.5, workers=workers, seed=0)
+        planner.plan(state)
+        planner.time_budget = seconds
+        planner.plan(state)
+        print(f"{workers:3d} cores: {planner.evaluated:6d} shots in {planner.elapsed:5.2f} s, {planner.shots_per_second():8.1f} shots/s")
+        planner.close()
+
+
+if __name__ == "__main__":
+    benchmark(float(sys.argv[1]) if len(sys.argv) > 1 else 3.0)
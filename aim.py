@@ -0,0 +1,175 @@
+import time
+import pygame
+from collections import OrderedDict
+from math import radians
+
+
+GHOST_COLOUR = (255, 255, 255, 110)
+
+
+class Prediction:
+    # One shot played forward on its own copy of the table, a few steps at
+    # a time, recording the corners of the cue ball's path and the first
+    # ball it touches. It steps tick by tick like the game rather than
+    # fast-forwarding like the planner, since the closed form drifts in the
+    # last bits and a break amplifies that into a different shot.
+    def __init__(self, state, angle, force, max_steps):
+        self.sim = state.copy()
+        self.sim.on_collision(self.collision)
+        self.sim.on_pocket(self.pocket)
+        self.start_tick = self.sim.tick
+        self.max_steps = max_steps
+        main = self.sim.main_ball
+        self.x = main.x + main.radius
+        self.y = main.y + main.radius
+        self.path = [(self.x, self.y)]
+        self.open_end = False
+        self.turned = False
+        self.contact = None
+        self.target = None
+        self.steps = 0
+        self.done = force <= 0
+        self.sim.strike(angle, force)
+
+    def collision(self, ball, other_ball):
+        main = self.sim.main_ball
+        if self.contact is None and main in (ball, other_ball):
+            target = other_ball if ball is main else ball
+            self.contact = (main.x + main.radius, main.y + main.radius)
+            self.target = (target.x + target.radius, target.y + target.radius)
+            self.path.append(self.contact)
+            self.turned = True
+
+    def pocket(self, ball, pocket):
+        # The cue ball is already back on its spot by now; its path ends
+        # in the pocket.
+        if ball is self.sim.main_ball:
+            self.path.append(self.sim.table.pocket_map.position(pocket))
+            self.done = True
+
+    def advance(self, deadline):
+        sim = self.sim
+        main = sim.main_ball
+        # Stop early rather than start a step that would likely overrun,
+        # taking the last one as a guess; the first always runs.
+        now = time.perf_counter()
+        step_time = 0
+        while not self.done and now + step_time < deadline:
+            vx, vy = main.vx, main.vy
+            sim.step()
+            sim.events.clear()
+            self.steps += 1
+            step_time = time.perf_counter() - now
+            now += step_time
+            if not self.done:
+                self.extend(main, vx, vy)
+            if not sim.in_motion() or sim.tick - self.start_tick >= self.max_steps:
+                self.done = True
+        if self.done:
+            self.sim = None
+
+    def extend(self, main, vx, vy):
+        # Steps are far longer than a ball, so a rail bounce inside one is
+        # put back where the lines in and out of it cross. Straight runs
+        # only move the open end of the path along.
+        x = main.x + main.radius
+        y = main.y + main.radius
+        cross = vx * main.vy - vy * main.vx
+        if not self.turned and abs(cross) > 1e-9 * (vx**2 + vy**2):
+            dx = x - self.x
+            dy = y - self.y
+            t = (dx * main.vy - dy * main.vx) / cross
+            s = (vx * dy - vy * dx) / cross
+            if t > 0 and s > 0:
+                self.path.append((self.x + vx * t, self.y + vy * t))
+                self.turned = True
+        if self.open_end and not self.turned:
+            self.path[-1] = (x, y)
+        else:
+            self.path.append((x, y))
+        self.open_end = True
+        self.turned = False
+        self.x = x
+        self.y = y
+
+
+class AimAssist:
+    # Ghost path of the cue ball for the current aim. Predictions are kept
+    # per quantised (angle, force) and dropped whenever the table changes;
+    # the one being aimed at is played further each frame within budget
+    # seconds, so a long shot fills in over the frames that follow.
+    def __init__(self, angle_step=radians(0.2), force_step=2, budget=0.004, max_steps=3000, max_entries=256):
+        self.angle_step = angle_step
+        self.force_step = force_step
+        self.budget = budget
+        self.max_steps = max_steps
+        self.max_entries = max_entries
+        self.predictions = OrderedDict()
+        self.table_key = None
+        self.refining = False
+        self.image = None
+        self.image_key = None
+        self.image_position = (0, 0)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.steps = 0
+
+    def table_state(self, sim):
+        positions = tuple(round(value * 4) for ball in sim.balls for value in (ball.x, ball.y))
+        return (positions, tuple(sim.players), sim.active_player_index, sim.bomb_flag)
+
+    def predict(self, sim, angle, force):
+        table_key = self.table_state(sim)
+        if table_key != self.table_key:
+            if self.predictions:
+                self.invalidations += 1
+            self.predictions.clear()
+            self.table_key = table_key
+        key = (round(angle / self.angle_step), round(force / self.force_step))
+        prediction = self.predictions.get(key)
+        if prediction is None:
+            self.misses += 1
+            prediction = self.predictions[key] = Prediction(sim, key[0] * self.angle_step, key[1] * self.force_step, self.max_steps)
+            if len(self.predictions) > self.max_entries:
+                self.predictions.popitem(last=False)
+        else:
+            self.hits += 1
+            self.predictions.move_to_end(key)
+        if not prediction.done:
+            steps = prediction.steps
+            prediction.advance(time.perf_counter() + self.budget)
+            self.steps += prediction.steps - steps
+        return prediction
+
+    def draw(self, screen, sim, angle, force):
+        prediction = self.predict(sim, angle, force)
+        self.refining = not prediction.done
+        if len(prediction.path) < 2:
+            return
+        # The image is only redrawn when the path grows or the aim moves
+        # to another prediction, so a still aim costs the renderer nothing.
+        image_key = (id(prediction), len(prediction.path), prediction.path[-1])
+        if image_key != self.image_key:
+            self.image, self.image_position = self.render(prediction, sim.main_ball.radius)
+            self.image_key = image_key
+        screen.blit(self.image, self.image_position)
+
+    def render(self, prediction, radius):
+        points = list(prediction.path)
+        rings = [point for point in (prediction.contact, prediction.target) if point is not None]
+        margin = radius + 2
+        left = int(min(x for x, _ in points + rings)) - margin
+        top = int(min(y for _, y in points + rings)) - margin
+        right = int(max(x for x, _ in points + rings)) + margin
+        bottom = int(max(y for _, y in points + rings)) + margin
+        image = pygame.Surface((right - left, bottom - top), pygame.SRCALPHA)
+        pygame.draw.lines(image, GHOST_COLOUR, False, [(x - left, y - top) for x, y in points], 2)
+        for x, y in rings:
+            pygame.draw.circle(image, GHOST_COLOUR, (x - left, y - top), radius, 2)
+        return image, (left, top)
+
+    def report(self):
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups * 100 if lookups else 0
+        return f"aim assist: {self.misses} predictions, {rate:.0f}% of {lookups} lookups cached, {self.steps} steps, {self.invalidations} table changes"
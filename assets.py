@@ -0,0 +1,194 @@
+import pygame
+import os
+import re
+import time
+import queue
+import threading
+from collections import OrderedDict
+
+
+ASSET_FOLDERS = ["player_1", "player_2", "player_3", "player_4", "house", "menu", "startscreen", "background"]
+
+STREAMED_SEQUENCES = [
+    ("startscreen", "jump"),
+    ("player_1", "goal"),
+    ("player_2", "goal"),
+    ("player_3", "goal"),
+    ("player_4", "goal"),
+    ("house", "countdown"),
+    ("house", "explosion"),
+    ("house", "teleport"),
+]
+
+FRAME_PATTERN = re.compile(r"^(.*)_(\d+)$")
+
+
+def asset_key(path):
+    folder = path.replace("\\", "/").split("/")[0]
+    name = os.path.splitext(os.path.basename(path))[0]
+    match = FRAME_PATTERN.match(name)
+    if match:
+        return (folder, match.group(1), int(match.group(2)))
+    return (folder, name)
+
+
+def is_sprite(path):
+    name = os.path.splitext(os.path.basename(path))[0]
+    return not (name.endswith("_hitbox") or name.endswith("_clickbox") or name == "pause_region")
+
+
+class Assets:
+    def __init__(self, folders=ASSET_FOLDERS, streamed=STREAMED_SEQUENCES):
+        self.folders = folders
+        self.streamed = set(streamed)
+        self.sprites = {}
+        self.sequences = {}
+        self.paths = {}
+        self.pending = set()
+        self.ready = queue.Queue()
+        self.worker = None
+        self.placeholder = None
+        self.load_time = 0
+        self.stream_time = 0
+        self.stream_start = 0
+        self.memory = 0
+        self.loaded = False
+
+    def load(self, stream=True):
+        # The sprites are shared by the whole process; loading them twice
+        # would only find every key already taken.
+        if self.loaded:
+            return
+        start = time.perf_counter()
+        self.placeholder = pygame.Surface((1, 1), pygame.SRCALPHA)
+        later = []
+        for path in self.find_sprites():
+            key = asset_key(path)
+            if stream and key[:2] in self.streamed:
+                self.pending.add(key)
+                later.append((key, path))
+            else:
+                self.add(key, self.load_image(path), path)
+        self.load_time = time.perf_counter() - start
+        self.loaded = True
+        if later:
+            self.stream_start = time.perf_counter()
+            self.worker = threading.Thread(target=self.decode, args=(later,), daemon=True)
+            self.worker.start()
+
+    def decode(self, paths):
+        for key, path in paths:
+            self.ready.put((key, pygame.image.load(path), path))
+
+    def pump(self, budget=0.004):
+        if not self.pending:
+            return 0
+        start = time.perf_counter()
+        loaded = 0
+        while time.perf_counter() - start < budget:
+            try:
+                key, image, path = self.ready.get_nowait()
+            except queue.Empty:
+                break
+            self.pending.discard(key)
+            self.add(key, image.convert_alpha(), path)
+            loaded += 1
+        if not self.pending:
+            self.stream_time = time.perf_counter() - self.stream_start
+        return loaded
+
+    def wait(self):
+        while self.pending:
+            key, image, path = self.ready.get()
+            self.pending.discard(key)
+            self.add(key, image.convert_alpha(), path)
+
+    def find_sprites(self):
+        paths = []
+        for folder in self.folders:
+            for root, _, files in os.walk(folder):
+                for file in sorted(files):
+                    path = os.path.join(root, file)
+                    if file.endswith(".png") and is_sprite(path):
+                        paths.append(path)
+        return paths
+
+    def load_image(self, path):
+        if os.path.basename(path).endswith("background.png"):
+            return pygame.image.load(path).convert()
+        return pygame.image.load(path).convert_alpha()
+
+    def add(self, key, image, path=None):
+        if key in self.sprites:
+            raise ValueError(f"duplicate asset key {key} for {path} and {self.paths[key]}")
+        self.sprites[key] = image
+        self.paths[key] = path
+        self.memory += image.get_pitch() * image.get_height()
+        if len(key) == 3:
+            self.sequences.setdefault(key[:2], {})[key[2]] = image
+
+    def __getitem__(self, key):
+        try:
+            return self.sprites[key]
+        except KeyError:
+            if key not in self.pending:
+                raise
+            return self.fallback(key)
+
+    def __contains__(self, key):
+        return key in self.sprites or key in self.pending
+
+    def fallback(self, key):
+        loaded = self.sequences.get(key[:2])
+        if not loaded:
+            return self.placeholder
+        return loaded[min(loaded, key=lambda index: abs(index - key[2]))]
+
+    def report(self):
+        report = f"loaded {len(self.sprites)} sprites in {self.load_time * 1000:.0f} ms, {self.memory / 2**20:.1f} MiB"
+        if self.pending:
+            report += f", {len(self.pending)} streaming"
+        elif self.stream_time:
+            report += f", streamed the rest in {self.stream_time * 1000:.0f} ms"
+        return report
+
+
+class RotationCache:
+    # Rotated copies of sprites, with the angle rounded to a multiple of
+    # step degrees. The least recently used ones are dropped once they
+    # take more than max_bytes.
+    def __init__(self, step=0.5, max_bytes=64 * 2**20):
+        self.step = step
+        self.turns = round(360 / step)
+        self.max_bytes = max_bytes
+        self.images = OrderedDict()
+        self.memory = 0
+        self.hits = 0
+        self.misses = 0
+
+    def rotated(self, key, angle):
+        cache_key = (key, round(angle / self.step) % self.turns)
+        image = self.images.get(cache_key)
+        if image is not None:
+            self.hits += 1
+            self.images.move_to_end(cache_key)
+            return image
+        self.misses += 1
+        image = pygame.transform.rotate(assets[key], cache_key[1] * self.step)
+        if key in assets.pending:
+            return image
+        self.images[cache_key] = image
+        self.memory += image.get_pitch() * image.get_height()
+        while self.memory > self.max_bytes and len(self.images) > 1:
+            _, dropped = self.images.popitem(last=False)
+            self.memory -= dropped.get_pitch() * dropped.get_height()
+        return image
+
+    def report(self):
+        lookups = self.hits + self.misses
+        hit_rate = self.hits / lookups * 100 if lookups else 0
+        return f"rotations: {len(self.images)} cached, {self.memory / 2**20:.1f} MiB, {self.hits} hits, {self.misses} misses ({hit_rate:.0f}% hit rate)"
+
+
+assets = Assets()
+rotations = RotationCache()
@@ -0,0 +1,136 @@
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from simulation import PoolSimulation, simulate_shot, BALL_OWNERSHIP
+from ai import ShotPlanner, evaluate_shots
+
+
+def choose_shot(state, planner, samples, max_steps):
+    # A cheap bot for batch runs: the best of a few sampled shots, all
+    # evaluated in this process since games already run one per core.
+    shots = [planner.sample(state) for _ in range(max(samples, 1))]
+    if samples <= 1:
+        return shots[0]
+    _, angle, force = max(evaluate_shots(state, shots, max_steps))
+    return angle, force
+
+
+def play_game(game_id, player_number, seed, settings):
+    start = time.perf_counter()
+    sim = PoolSimulation()
+    # The game sweeps continuously and steps every tick; the closed-form
+    # jump is only for comparing against it.
+    sim.continuous = settings.get("continuous", True)
+    sim.ball_ownerships = settings.get("ball_ownership", BALL_OWNERSHIP)
+    sim.explosion_force = settings.get("explosion_force", sim.explosion_force)
+    sim.explosion_radius = settings.get("explosion_radius", sim.explosion_radius)
+    sim.rack(player_number, seed)
+    planner = ShotPlanner(max_force=settings.get("max_force", 300), max_steps=settings.get("max_steps", 3000), seed=seed)
+    samples = settings.get("samples", 8)
+    turns = []
+    eliminated = []
+    bombs = 0
+    steps = 0
+    winner = None
+    while len(turns) < settings.get("max_turns", 300):
+        angle, force = choose_shot(sim, planner, samples, planner.max_steps)
+        sim, events = simulate_shot(sim, angle, force, planner.max_steps, settings.get("fast_forward", False), in_place=True)
+        turn = events[-1]
+        armed = sum(1 for event in events if event['type'] == 'bomb')
+        bombs += armed
+        steps += turn['steps']
+        eliminated.extend(turn['eliminated'])
+        turns.append({
+            'player': turn['player'],
+            'pocketed': [event['owner'] for event in events if event['type'] == 'goal'],
+            'scratch': turn['scratch'],
+            'bombs': armed,
+            'switched': turn['switched'],
+        })
+        if turn['winner']:
+            winner = turn['winner']
+            break
+    return {
+        'game': game_id,
+        'seed': seed,
+        'players': player_number,
+        'winner': winner,
+        'finished': winner is not None,
+        'turns': len(turns),
+        'steps': steps,
+        'bomb_triggers': bombs,
+        'eliminated': eliminated,
+        'per_turn': turns,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def run_games(games, player_counts, seed, settings, workers=None, output=sys.stdout):
+    wins = {}
+    finished = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_game, i, player_counts[i % len(player_counts)], seed + i, settings) for i in range(games)]
+        for future in as_completed(futures):
+            result = future.result()
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            finished += result['finished']
+            key = (result['players'], result['winner'])
+            wins[key] = wins.get(key, 0) + 1
+    elapsed = time.perf_counter() - start
+    print(f"{games} games in {elapsed:.1f} s ({games / elapsed:.2f} games/s), {finished} finished", file=sys.stderr)
+    for (players, winner), count in sorted(wins.items(), key=lambda item: (item[0][0], str(item[0][1]))):
+        print(f"  {players} players: {winner or 'unfinished'} {count}", file=sys.stderr)
+
+
+def add_arguments(parser):
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--players", type=int, nargs="+", choices=[2, 3, 4], default=[2, 3, 4], help="player counts to cycle through")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", metavar="PATH", help="JSON Lines file, stdout by default")
+    parser.add_argument("--samples", type=int, default=8, help="shots the bots evaluate per turn, 1 shoots the first sample")
+    parser.add_argument("--max-turns", type=int, default=300)
+    parser.add_argument("--max-force", type=float, default=300, help="strongest strike, Cue.max_force in the game")
+    parser.add_argument("--explosion-force", type=float, default=200)
+    parser.add_argument("--explosion-radius", type=float, default=300)
+    parser.add_argument("--discrete", action="store_true", help="step without the continuous collision sweep the game uses")
+    parser.add_argument("--fast-forward", action="store_true", help="jump over free rolling in closed form rather than stepping every tick like the game")
+    parser.add_argument("--ball-ownership", metavar="JSON", help='layouts to test, e.g. \'{"2": [0, 1, 1, 1, 1, 1, 1, 0, 0, 2, 2, 2, 2, 2, 2, 0]}\'')
+
+
+def main(args):
+    settings = {
+        'samples': args.samples,
+        'max_turns': args.max_turns,
+        'max_force': args.max_force,
+        'explosion_force': args.explosion_force,
+        'explosion_radius': args.explosion_radius,
+        'continuous': not args.discrete,
+        'fast_forward': args.fast_forward,
+    }
+    if args.ball_ownership:
+        layouts = dict(BALL_OWNERSHIP)
+        for players, layout in json.loads(args.ball_ownership).items():
+            if len(layout) != 16:
+                raise SystemExit(f"the layout for {players} players needs 16 entries, got {len(layout)}")
+            layouts[int(players)] = layout
+        settings['ball_ownership'] = layouts
+    if args.output:
+        with open(args.output, "w") as output:
+            run_games(args.games, args.players, args.seed, settings, args.workers, output)
+    else:
+        run_games(args.games, args.players, args.seed, settings, args.workers)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play ANARCHY POOL games between bots without a window.")
+    add_arguments(parser)
+    main(parser.parse_args())
@@ -0,0 +1,87 @@
+import os
+import sys
+import copy
+import time
+import random
+import numpy as np
+from math import sqrt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from simulation import PoolSimulation, Table, Ball, BALL_SIZE
+from hitmaps import DistanceField, PocketMap, MAX_DISTANCE
+
+
+BALL_COUNTS = [16, 100, 1000, 10000]
+BRUTE_FORCE_LIMIT = 1000
+REPEATS = 5
+
+
+def scatter(n, seed=0):
+    rng = random.Random(seed)
+    side = sqrt(n * (2 * BALL_SIZE) ** 2)
+    balls = []
+    for _ in range(n):
+        ball = Ball("player_1", rng.uniform(0, side), rng.uniform(0, side))
+        ball.vx = rng.uniform(-100, 100)
+        ball.vy = rng.uniform(-100, 100)
+        balls.append(ball)
+    return balls
+
+
+def open_table():
+    # The scatter is far larger than the real table, whose rails and
+    # pockets would swallow most of it in one step. Lookups clamp to the
+    # raster, so one pixel far from any rail or pocket covers the plane.
+    far = np.full((1, 1), MAX_DISTANCE, dtype=np.float32)
+    flat = np.zeros((1, 1), dtype=np.float32)
+    return Table(DistanceField(far, flat, flat), PocketMap(np.zeros((1, 1), dtype=np.uint8), far, []))
+
+
+def time_collisions(sim, balls):
+    best = None
+    for _ in range(REPEATS):
+        sim.balls = copy.deepcopy(balls)
+        start = time.perf_counter()
+        sim.handle_collisions()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, sim.pair_tests, sim.balls
+
+
+def time_steps(sim, balls):
+    # The whole tick, movement, rails and pockets included, to judge the
+    # collision speedup against.
+    best = None
+    for _ in range(REPEATS):
+        sim.balls = copy.deepcopy(balls)
+        sim.owners.rebuild(sim.balls)
+        start = time.perf_counter()
+        sim.step()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    sim = PoolSimulation(open_table())
+    print(f"{'balls':>6} {'grid pairs':>11} {'grid ms':>9} {'step ms':>9} {'brute pairs':>12} {'brute ms':>9} {'step ms':>9} {'identical':>9}")
+    for n in BALL_COUNTS:
+        balls = scatter(n)
+        sim.broad_phase = True
+        grid_time, grid_pairs, grid_balls = time_collisions(sim, balls)
+        grid_step = time_steps(sim, balls)
+        if n <= BRUTE_FORCE_LIMIT:
+            sim.broad_phase = False
+            brute_time, brute_pairs, brute_balls = time_collisions(sim, balls)
+            brute_step = time_steps(sim, balls)
+            identical = all((a.vx, a.vy, a.x, a.y) == (b.vx, b.vy, b.x, b.y) for a, b in zip(grid_balls, brute_balls))
+            brute = f"{brute_pairs:>12} {brute_time * 1000:>9.2f} {brute_step * 1000:>9.2f} {str(identical):>9}"
+        else:
+            brute = f"{n * (n - 1) // 2:>12} {'-':>9} {'-':>9} {'-':>9}"
+        print(f"{n:>6} {grid_pairs:>11} {grid_time * 1000:>9.2f} {grid_step * 1000:>9.2f} {brute}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import subprocess
+from math import radians
+from statistics import median
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame
+import game
+from assets import assets
+from simulation import Ball
+
+
+BALL_COUNTS = [16, 32, 64, 128]
+SEED = 0
+REPEATS = 7
+TARGET_TIME = 0.05
+
+
+def table_scene(sim, n, seed=SEED):
+    # The seeded 4-player rack, topped up with balls at free spots on the
+    # table, all rolling at seeded speeds.
+    rng = random.Random(seed)
+    sim.rack(4, seed)
+    field = sim.table.distance_field
+    balls = list(sim.balls)
+    while len(balls) < n:
+        ball = Ball(rng.choice(sim.players), rng.uniform(60, 780), rng.uniform(80, 460))
+        x, y = ball.x + ball.radius, ball.y + ball.radius
+        if field.distance_at(x, y) < ball.radius + 2 or sim.table.pocket_map.clearance_at(x, y) < ball.radius:
+            continue
+        if any((x - other.x - other.radius) ** 2 + (y - other.y - other.radius) ** 2 < (2 * ball.radius + 1) ** 2 for other in balls):
+            continue
+        balls.append(ball)
+    for slot, ball in enumerate(balls):
+        ball.slot = slot
+        ball.vx = rng.uniform(-150, 150)
+        ball.vy = rng.uniform(-150, 150)
+    sim.roster = balls
+    sim.balls = list(balls)
+    sim.owners.rebuild(sim.balls)
+    return sim.snapshot()
+
+
+def measure(run, reset=None, repeats=REPEATS):
+    # Calls run enough times per round for the round to take about
+    # TARGET_TIME, and reports the per-call time of the best and the
+    # median round. reset restores the starting state before each round.
+    number = 1
+    while True:
+        if reset:
+            reset()
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        elapsed = time.perf_counter() - start
+        if elapsed >= TARGET_TIME / 10 or number >= 10**6:
+            break
+        number *= 10
+    number = max(1, round(number * TARGET_TIME / max(elapsed, 1e-9)))
+    rounds = []
+    for _ in range(repeats):
+        if reset:
+            reset()
+        start = time.perf_counter()
+        for _ in range(number):
+            run()
+        rounds.append((time.perf_counter() - start) / number)
+    return {"calls": number, "best_us": min(rounds) * 1e6, "median_us": median(rounds) * 1e6}
+
+
+def physics_benchmarks(g, n):
+    sim = g.sim
+    snapshot = table_scene(sim, n)
+
+    def reset():
+        sim.restore(snapshot)
+
+    def move():
+        for ball in sim.balls:
+            ball.move(sim.table)
+
+    yield "Ball.move (all balls)", measure(move, reset)
+    yield "PoolSimulation.handle_collisions", measure(sim.handle_collisions, reset)
+    yield "PoolSimulation.monitor_balls", measure(sim.monitor_balls, reset)
+    yield "PoolSimulation.step", measure(sim.step, reset)
+
+
+def render_benchmarks(g, n):
+    sim = g.sim
+    snapshot = table_scene(sim, n)
+
+    def reset():
+        sim.restore(snapshot)
+        g.renderer.invalidate()
+
+    def frame():
+        sim.step()
+        g.update_screen_game()
+
+    def still_frame():
+        g.update_screen_game()
+
+    yield "Game.update_screen_game (moving)", measure(frame, reset)
+    yield "Game.update_screen_game (at rest)", measure(still_frame, reset)
+
+
+def cue_benchmarks(g):
+    sim = g.sim
+    table_scene(sim, 16)
+    cue = g.cue
+    cue.ready_status = True
+    cue.distance_to_ball = 80
+    angles = [radians(0.25 * i) for i in range(160)]
+    state = {"i": 0}
+
+    def draw():
+        cue.angle = angles[state["i"] % len(angles)]
+        state["i"] += 1
+        cue.draw(sim.main_ball, g.renderer)
+        g.renderer.current.clear()
+
+    cue.striking = False
+    yield "Cue.draw (aiming)", measure(draw)
+    cue.striking = True
+    yield "Cue.draw (striking)", measure(draw)
+    cue.striking = False
+
+
+def startscreen_benchmarks(g):
+    def frame():
+        g.show_and_monitor_startscreen(g.startscreen_renderer)
+
+    g.startscreen_renderer.invalidate()
+    yield "Game.show_and_monitor_startscreen", measure(frame)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(ball_counts=BALL_COUNTS):
+    g = game.Game()
+    game.game = g
+    assets.wait()
+    g.player_number = g.player_number_init = 4
+    g.balls_start()
+    results = []
+
+    def add(name, balls, result):
+        results.append({"name": name, "balls": balls, **result})
+        print(f"{name:<40} {balls if balls is not None else '-':>5} {result['best_us']:>12.1f} {result['median_us']:>12.1f}")
+
+    print(f"{'benchmark':<40} {'balls':>5} {'best us':>12} {'median us':>12}")
+    for n in ball_counts:
+        for name, result in physics_benchmarks(g, n):
+            add(name, n, result)
+    for n in ball_counts:
+        for name, result in render_benchmarks(g, n):
+            add(name, n, result)
+    for name, result in cue_benchmarks(g):
+        add(name, None, result)
+    for name, result in startscreen_benchmarks(g):
+        add(name, None, result)
+    pygame.quit()
+    return {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pygame": pygame.version.ver,
+        "machine": platform.machine(),
+        "seed": SEED,
+        "continuous": g.sim.continuous,
+        "results": results,
+    }
+
+
+def compare(report, baseline):
+    old = {(result["name"], result["balls"]): result for result in baseline["results"]}
+    print(f"\ncompared with {baseline.get('commit')}:")
+    print(f"{'benchmark':<40} {'balls':>5} {'before us':>12} {'after us':>12} {'change':>8}")
+    for result in report["results"]:
+        before = old.get((result["name"], result["balls"]))
+        if before:
+            change = result["best_us"] / before["best_us"] - 1
+            balls = result["balls"] if result["balls"] is not None else "-"
+            print(f"{result['name']:<40} {balls:>5} {before['best_us']:>12.1f} {result['best_us']:>12.1f} {change:>+8.0%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the physics and rendering hot paths.")
+    parser.add_argument("--json", metavar="PATH", help="write the results to this file")
+    parser.add_argument("--compare", metavar="PATH", help="show the change against results saved with --json")
+    parser.add_argument("--balls", type=int, nargs="+", default=BALL_COUNTS, help="ball counts to run at")
+    args = parser.parse_args()
+    report = run(args.balls)
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,356 @@
+import sys
+import time
+import numpy as np
+from math import sin, cos, atan2
+from simulation import PoolSimulation, Ball, MainBall, FunBall, REST_THRESHOLD
+
+
+X, Y, VX, VY, ALIVE, OWNER = range(6)
+FIELDS = 6
+
+NORMAL, MAIN, FUN = 0, 1, 2
+
+SEATS = ["player_1", "player_2", "player_3", "player_4"]
+
+
+class BatchPoolEnv:
+    # Many independent tables stepped in lockstep on one (tables, balls,
+    # FIELDS) array, with the same physics as the discrete
+    # PoolSimulation.step and the same turn, elimination and win rules as
+    # check_turn_switch, remove_player and check_win_con, written over
+    # arrays. Seats are numbered 1 to 4 and 0 is the house, or nobody.
+    #
+    # step(actions) strikes on every table waiting for a shot, using
+    # actions[table] = (angle, force), then advances ticks_per_step
+    # physics steps. A table waits for its next shot once it comes to
+    # rest and its turn has been settled. Finished tables are racked
+    # again before step returns.
+    def __init__(self, tables, player_number=2, ticks_per_step=1, max_turns=300, seed=0, table=None):
+        self.sim = PoolSimulation(table)
+        self.table = self.sim.table
+        self.tables = tables
+        self.player_number = player_number
+        self.ticks_per_step = ticks_per_step
+        self.max_turns = max_turns
+        self.next_seed = seed
+        self.balls = len(self.sim.ball_ownerships[player_number])
+
+        ball = Ball("house", 0, 0)
+        self.radius = ball.radius
+        self.dt = ball.dt
+        self.drag = ball.drag
+        self.damping = ball.damping
+        self.mass = ball.mass
+        self.x_start = self.table.x_main_start
+        self.y_start = self.table.y_main_start
+
+        field = self.table.distance_field
+        self.field_size = (field.width, field.height)
+        self.distance = field.distance.ravel()
+        self.normal_x = field.normal_x.ravel()
+        self.normal_y = field.normal_y.ravel()
+        pocket_map = self.table.pocket_map
+        self.pocket_size = (pocket_map.width, pocket_map.height)
+        self.labels = pocket_map.labels.ravel()
+
+        self.state = np.zeros((tables, self.balls, FIELDS))
+        self.x = self.state[..., X]
+        self.y = self.state[..., Y]
+        self.vx = self.state[..., VX]
+        self.vy = self.state[..., VY]
+        self.flat = self.state.reshape(-1)
+        self.alive = np.zeros((tables, self.balls), dtype=bool)
+        self.owner = np.zeros((tables, self.balls), dtype=np.int64)
+        self.kind = np.zeros((tables, self.balls), dtype=np.int8)
+        self.seats = np.zeros((tables, len(SEATS)), dtype=bool)
+        self.active_index = np.zeros(tables, dtype=np.int64)
+        self.shooter = np.zeros(tables, dtype=np.int64)
+        self.scored = np.zeros(tables, dtype=bool)
+        self.bomb_flag = np.zeros(tables, dtype=bool)
+        self.bomb_timer = np.zeros(tables, dtype=np.int64)
+        self.x_bomb = np.zeros(tables)
+        self.y_bomb = np.zeros(tables)
+        self.ready = np.ones(tables, dtype=bool)
+        self.turns = np.zeros(tables, dtype=np.int64)
+        self.ticks = np.zeros(tables, dtype=np.int64)
+        self.winner = np.zeros(tables, dtype=np.int64)
+        self.table_steps = 0
+
+        self.first, self.second = np.triu_indices(self.balls, 1)
+        self.level = np.zeros(len(self.first), dtype=np.int64)
+        latest = np.zeros(self.balls, dtype=np.int64)
+        for pair, (i, j) in enumerate(zip(self.first, self.second)):
+            self.level[pair] = latest[i] = latest[j] = max(latest[i], latest[j]) + 1
+
+        self.pocket_reward = 1.0
+        self.own_pocket_reward = -1.0
+        self.scratch_reward = -1.0
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.next_seed = seed
+        self.rack(np.arange(self.tables))
+        return self.state
+
+    def rack(self, tables):
+        # PoolSimulation.rack lays out every table, seeded one after the
+        # other from next_seed.
+        sim = self.sim
+        for b in tables.tolist():
+            sim.rack(self.player_number, self.next_seed)
+            self.next_seed += 1
+            self.state[b] = 0
+            for ball in sim.roster:
+                self.x[b, ball.slot] = ball.x
+                self.y[b, ball.slot] = ball.y
+                self.owner[b, ball.slot] = SEATS.index(ball.owner) + 1 if ball.owner in SEATS else 0
+                self.kind[b, ball.slot] = MAIN if isinstance(ball, MainBall) else FUN if isinstance(ball, FunBall) else NORMAL
+        self.alive[tables] = True
+        self.active_index[tables] = 0
+        self.scored[tables] = False
+        self.bomb_flag[tables] = False
+        self.bomb_timer[tables] = 0
+        self.ready[tables] = True
+        self.turns[tables] = 0
+        self.ticks[tables] = 0
+        self.remove_player()
+        self.state[..., ALIVE] = self.alive
+        self.state[..., OWNER] = self.owner
+
+    def active_seat(self):
+        # players[active_player_index], or 0 where that is an IndexError.
+        rank = np.cumsum(self.seats, axis=1) - 1
+        match = self.seats & (rank == self.active_index[:, None])
+        return np.where(match.any(axis=1), match.argmax(axis=1) + 1, 0)
+
+    def step(self, actions=None):
+        if actions is not None:
+            self.strike(np.asarray(actions, dtype=np.float64))
+        reward = np.zeros(self.tables)
+        done = np.zeros(self.tables, dtype=bool)
+        for _ in range(self.ticks_per_step):
+            self.advance(reward)
+            done |= self.settle()
+        winner = self.winner.copy()
+        if done.any():
+            self.rack(np.nonzero(done)[0])
+        self.state[..., ALIVE] = self.alive
+        return self.state, reward, done, {"winner": winner, "ready": self.ready, "active_player": self.active_seat()}
+
+    def strike(self, actions):
+        rows, slots = np.nonzero(self.ready[:, None] & (self.kind == MAIN))
+        if not len(rows):
+            return
+        angle = actions[rows, 0]
+        force = actions[rows, 1]
+        self.vx[rows, slots] = force * np.cos(angle)
+        self.vy[rows, slots] = force * np.sin(angle)
+        self.shooter[rows] = self.active_seat()[rows]
+        self.ready[rows] = False
+
+    def advance(self, reward):
+        self.update_bomb()
+        self.move()
+        self.check_pockets(reward)
+        self.remove_player()
+        self.handle_collisions()
+        self.ticks += 1
+        self.table_steps += self.tables
+
+    def update_bomb(self):
+        if not self.bomb_flag.any():
+            return
+        self.bomb_timer[self.bomb_flag] -= 1
+        exploding = self.bomb_flag & (self.bomb_timer <= 0)
+        if not exploding.any():
+            return
+        # Bombs are rare, so the blast runs through math like
+        # PoolSimulation.explosion: numpy's arctan2 and ** 0.5 round
+        # differently in the last bit.
+        sim = self.sim
+        for b, slot in zip(*np.nonzero(exploding[:, None] & self.alive)):
+            distance_x = self.x[b, slot] - self.x_bomb[b]
+            distance_y = self.y[b, slot] - self.y_bomb[b]
+            distance = (distance_x ** 2 + distance_y ** 2) ** 0.5
+            if distance < sim.explosion_radius:
+                force = sim.explosion_force * (1 - distance / sim.explosion_radius)
+                angle = atan2(distance_y, distance_x)
+                self.vx[b, slot] += force * cos(angle) / self.mass
+                self.vy[b, slot] += force * sin(angle) / self.mass
+        self.bomb_flag[exploding] = False
+
+    def pixels(self, x, y, size):
+        width, height = size
+        ix = np.clip(x.astype(np.int64), 0, width - 1)
+        iy = np.clip(y.astype(np.int64), 0, height - 1)
+        return ix * height + iy
+
+    def move(self):
+        # Ball.accelerate with no input, then Ball.bounce against the
+        # distance field at the proposed position.
+        self.vx -= self.vx * self.drag
+        self.vy -= self.vy * self.drag
+        new_x = self.x + self.vx * self.dt
+        new_y = self.y + self.vy * self.dt
+        flat = self.pixels(new_x + self.radius, new_y + self.radius, self.field_size)
+        distance = self.distance[flat]
+        rows, slots = np.nonzero(distance < self.radius)
+        if len(rows):
+            index = flat[rows, slots]
+            normal_x = self.normal_x[index].astype(np.float64)
+            normal_y = self.normal_y[index].astype(np.float64)
+            vx = self.vx[rows, slots]
+            vy = self.vy[rows, slots]
+            velocity_normal = vx * normal_x + vy * normal_y
+            approaching = velocity_normal < 0
+            self.vx[rows, slots] = np.where(approaching, vx - (2 - self.damping) * velocity_normal * normal_x, vx)
+            self.vy[rows, slots] = np.where(approaching, vy - (2 - self.damping) * velocity_normal * normal_y, vy)
+            depth = self.radius - distance[rows, slots].astype(np.float64)
+            new_x[rows, slots] += depth * normal_x
+            new_y[rows, slots] += depth * normal_y
+        self.x[...] = new_x
+        self.y[...] = new_y
+
+    def check_pockets(self, reward):
+        pocketed = self.alive & (self.labels[self.pixels(self.x + self.radius, self.y + self.radius, self.pocket_size)] > 0)
+        if not pocketed.any():
+            return
+        rows, slots = np.nonzero(pocketed)
+        self.vx[rows, slots] = 0
+        self.vy[rows, slots] = 0
+        kind = self.kind[rows, slots]
+        main = kind == MAIN
+        self.x[rows[main], slots[main]] = self.x_start
+        self.y[rows[main], slots[main]] = self.y_start
+
+        active = self.active_seat()[rows]
+        owner = self.owner[rows, slots]
+        self.scored[rows[~main & (active > 0) & (owner != active)]] = True
+        shooter = self.shooter[rows]
+        normal = kind == NORMAL
+        np.add.at(reward, rows[normal & (owner != shooter)], self.pocket_reward)
+        np.add.at(reward, rows[normal & (owner == shooter)], self.own_pocket_reward)
+        np.add.at(reward, rows[main], self.scratch_reward)
+
+        fun = kind == FUN
+        if fun.any():
+            # FunBall.check_goal: the bomb goes off at the mean of every
+            # ball still listed, summed in list order like the original.
+            tables = np.unique(rows[fun])
+            x_bomb = np.zeros(len(tables))
+            y_bomb = np.zeros(len(tables))
+            alive = self.alive[tables]
+            for slot in range(self.balls):
+                x_bomb += np.where(alive[:, slot], self.x[tables, slot], 0)
+                y_bomb += np.where(alive[:, slot], self.y[tables, slot], 0)
+            counter = alive.sum(axis=1)
+            self.x_bomb[tables] = x_bomb / counter
+            self.y_bomb[tables] = y_bomb / counter
+            self.bomb_timer[tables] = self.sim.bomb_countdown_steps
+            self.bomb_flag[tables] = True
+        self.alive[rows[~main], slots[~main]] = False
+
+    def remove_player(self):
+        for seat in range(len(SEATS)):
+            self.seats[:, seat] = (self.alive & (self.owner == seat + 1)).any(axis=1)
+
+    def handle_collisions(self):
+        # Every overlapping pair of every table at once. Within a table the
+        # scalar loop resolves pairs in order, so pairs are handled level
+        # by level: a pair's level is above that of every earlier pair it
+        # shares a ball with, so pairs in one level touch different balls.
+        reach = 2 * self.radius
+        # The broad phase runs in float32 with a pixel of slack; the
+        # contacts it finds are checked exactly below. Pocketed balls sit
+        # at NaN, which is never near anything.
+        center_x = np.where(self.alive, self.x, np.nan).astype(np.float32)
+        center_y = np.where(self.alive, self.y, np.nan).astype(np.float32)
+        dx = np.take(center_x, self.first, axis=1) - np.take(center_x, self.second, axis=1)
+        dy = np.take(center_y, self.first, axis=1) - np.take(center_y, self.second, axis=1)
+        rows, pairs = np.nonzero(dx * dx + dy * dy < reach * reach + 2 * reach)
+        if not len(rows):
+            return
+
+        # Two still balls only push each other if a moving ball reaches
+        # them through other contacts, like a cue ball hitting the rack.
+        # Racked balls overlap a little, so most contacts are of this kind
+        # and can be skipped.
+        first = rows * self.balls + self.first[pairs]
+        second = rows * self.balls + self.second[pairs]
+        moving = ((self.vx != 0) | (self.vy != 0)).ravel()
+        live = moving[first] | moving[second]
+        count = np.count_nonzero(live)
+        while count:
+            moving[first[live]] = True
+            moving[second[live]] = True
+            live = moving[first] | moving[second]
+            previous, count = count, np.count_nonzero(live)
+            if count == previous:
+                break
+        if not count:
+            return
+        pairs, first, second = pairs[live], first[live] * FIELDS, second[live] * FIELDS
+
+        flat = self.flat
+        dx = (flat[first + X] + self.radius) - (flat[second + X] + self.radius)
+        dy = (flat[first + Y] + self.radius) - (flat[second + Y] + self.radius)
+        distance = np.sqrt(dx ** 2 + dy ** 2)
+        touching = distance < reach
+        if not touching.all():
+            pairs, first, second, dx, dy, distance = pairs[touching], first[touching], second[touching], dx[touching], dy[touching], distance[touching]
+        normal_x = dx / distance
+        normal_y = dy / distance
+        level = self.level[pairs]
+        order = np.argsort(level, kind="stable")
+        bounds = (np.flatnonzero(np.diff(level[order])) + 1).tolist()
+        for start, end in zip([0] + bounds, bounds + [len(order)]):
+            group = order[start:end]
+            i = first[group] + VX
+            j = second[group] + VX
+            group_x = normal_x[group]
+            group_y = normal_y[group]
+            vx_i, vy_i, vx_j, vy_j = flat[i], flat[i + 1], flat[j], flat[j + 1]
+            velocity_normal = ((vx_i - vx_j) * group_x) + ((vy_i - vy_j) * group_y)
+            impulse = np.where(velocity_normal > 0, 0, (2 * velocity_normal) / (self.mass + self.mass))
+            flat[i] = vx_i - impulse * self.mass * group_x
+            flat[i + 1] = vy_i - impulse * self.mass * group_y
+            flat[j] = vx_j + impulse * self.mass * group_x
+            flat[j + 1] = vy_j + impulse * self.mass * group_y
+
+    def settle(self):
+        # simulate_shot's end of turn for every table that has come to
+        # rest since its strike: check_turn_switch, then check_win_con.
+        speed = np.sqrt(self.vx ** 2 + self.vy ** 2) * self.alive
+        main_speed = np.where(self.kind == MAIN, speed, 0).max(axis=1)
+        resting = ~self.ready & (speed.sum(axis=1) < REST_THRESHOLD) & (main_speed < REST_THRESHOLD) & ~self.bomb_flag
+        if not resting.any():
+            return resting
+        players = self.seats.sum(axis=1)
+        several = resting & (players > 1)
+        switch = several & ~self.scored
+        self.active_index[switch] = np.where(self.active_index[switch] >= players[switch] - 1, 0, self.active_index[switch] + 1)
+        self.scored[several] = False
+        self.turns[resting] += 1
+        self.ready[resting] = True
+        won = resting & (players == 1)
+        self.winner[resting] = 0
+        self.winner[won] = self.seats[won].argmax(axis=1) + 1
+        return resting & ((players <= 1) | (self.turns >= self.max_turns))
+
+
+def benchmark(tables=1024, seconds=5.0, player_number=2):
+    env = BatchPoolEnv(tables, player_number)
+    env.reset()
+    rng = np.random.default_rng(0)
+    games = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        actions = np.column_stack((rng.uniform(-np.pi, np.pi, tables), rng.uniform(60, 300, tables)))
+        _, _, done, _ = env.step(actions)
+        games += int(done.sum())
+    elapsed = time.perf_counter() - start
+    print(f"{tables} tables: {env.table_steps / elapsed:,.0f} table-steps/s, {games} games finished in {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 1024)
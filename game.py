@@ -1,9 +1,24 @@
+import os
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
 import pygame
 import time
-import os
-from math import sqrt, sin, cos, atan2, degrees, hypot, ceil
+from math import sqrt, sin, cos, atan2, degrees, ceil
 from statistics import mean
 import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from assets import assets, rotations
+from simulation import PoolSimulation, Table
+from ai import ShotPlanner
+from render import DirtyRenderer, Layer
+from scheduler import FrameScheduler, FixedTimestep
+from replay import Replay
+from profiler import FrameProfiler
+from hitmaps import HitMap, Pointer
+from aim import AimAssist
+import batch
 
 
 pygame.init()
@@ -17,155 +32,11 @@ YELLOW = (255, 255, 0)
 
 
 
-class Ball:
-    def __init__(self, object_folder, x, y):
-        self.image = pygame.image.load(f'{object_folder}/balls/idle.png').convert_alpha()
-        self.x = x
-        self.y = y
-        self.radius = int(self.image.get_width()/2) + 1
-        self.displacement_ball_collisions = 0
-        self.displacement_boundary_collisions = 2
-        self.vx = 0
-        self.vy = 0
-        self.ax = 0
-        self.ay = 0 
-        self.mass = 1
-        self.drag = 1/(50*sqrt(self.vx**2 + self.vy**2) + 100)
-        self.damping = 0.5
-        self.dt = 0.1
-        self.acceleration = 30
-        self.goal_status = False
-        self.owner = object_folder
-
-    def move(self, background_hitbox):
-        self.vx += self.ax * self.dt - self.vx*self.drag
-        self.vy += self.ay * self.dt - self.vy*self.drag
-
-        new_x = self.x + self.vx * self.dt
-        new_y = self.y + self.vy * self.dt
-        hit_boundary_top = background_hitbox.get_at((int(new_x + self.radius), int(new_y))) != WHITE
-        hit_boundary_bottom = background_hitbox.get_at((int(new_x + self.radius), int(new_y + 2*self.radius))) != WHITE
-        hit_boundary_left = background_hitbox.get_at((int(new_x), int(new_y + self.radius))) != WHITE
-        hit_boundary_right = background_hitbox.get_at((int(new_x + 2*self.radius), int(new_y + self.radius))) != WHITE
-        if hit_boundary_top:
-            self.vy = -self.vy * (1 - self.damping)
-        if hit_boundary_bottom:
-            self.vy = -self.vy * (1 - self.damping)
-        if hit_boundary_left:
-            self.vx = -self.vx * (1 - self.damping)
-        if hit_boundary_right:
-            self.vx = -self.vx * (1 - self.damping)
-        if hit_boundary_top:
-            new_y += self.displacement_boundary_collisions
-        if hit_boundary_bottom:
-            new_y -= self.displacement_boundary_collisions
-        if hit_boundary_left:
-            new_x += self.displacement_boundary_collisions
-        if hit_boundary_right:  
-            new_x -= self.displacement_boundary_collisions
-        self.x = new_x
-        self.y = new_y
-
-    def check_collision(self, other_ball):
-        dx = (self.x + self.radius) - (other_ball.x + other_ball.radius)
-        dy = (self.y + self.radius) - (other_ball.y + other_ball.radius)
-        distance = sqrt(dx**2 + dy**2)
-        if distance < self.radius + other_ball.radius:
-            normal_x = dx/distance
-            normal_y = dy/distance
-            relative_velocity_x = self.vx - other_ball.vx
-            relative_velocity_y = self.vy - other_ball.vy
-            velocity_normal = (relative_velocity_x * normal_x) + (relative_velocity_y * normal_y)
-            if velocity_normal > 0:
-                return
-            impulse = (2 * velocity_normal) / (self.mass + other_ball.mass)
-            self.vx -= impulse * other_ball.mass * normal_x
-            self.vy -= impulse * other_ball.mass * normal_y
-            other_ball.vx += impulse * self.mass * normal_x
-            other_ball.vy += impulse * self.mass * normal_y
-            self.x += self.displacement_ball_collisions * normal_x
-            self.y += self.displacement_ball_collisions * normal_y
-            other_ball.x -= self.displacement_ball_collisions * normal_x
-            other_ball.y -= self.displacement_ball_collisions * normal_y
-
-    def check_goal(self, goal_hitbox):
-        goal_status = goal_hitbox.get_at((int(self.x + self.radius), int(self.y + self.radius))) != WHITE
-        if goal_status:
-            self.vx = 0
-            self.vy = 0
-            if self.owner != "house":
-                game.goal_animations.append({
-                    'coords': (self.x, self.y),
-                    'start_time': pygame.time.get_ticks(),
-                    'owner': self.owner
-                })
-            self.goal_status = True
-
-
-
-    def draw(self, screen):
-        screen.blit(self.image, (self.x, self.y))
-
-
-
-
-class MainBall(Ball):
-    def __init__(self, object_folder, x, y, x_start, y_start):
-        super().__init__(object_folder, x, y)
-        self.image = pygame.image.load(f'{object_folder}/balls/idle_main.png').convert_alpha()
-        self.x_start = x_start
-        self.y_start = y_start
-
-    def check_goal(self, goal_hitbox):
-        goal_status = goal_hitbox.get_at((int(self.x + self.radius), int(self.y + self.radius))) != WHITE
-        if goal_status:
-            self.vx = 0
-            self.vy = 0
-            self.goal_status = True
-            game.teleport = True
-            game.teleport_start_time = pygame.time.get_ticks()
-            game.teleport_x_start = self.x + self.radius
-            game.teleport_y_start = self.y + self.radius
-            self.x = self.x_start
-            self.y = self.y_start
-
-
-
-
-class FunBall(Ball):
-    def __init__(self, object_folder, x, y):
-        super().__init__(object_folder, x, y)
-        self.image = pygame.image.load(f'{object_folder}/balls/idle_fun.png').convert_alpha()
-        self.mass = 1
-    
-    def check_goal(self, goal_hitbox):
-        goal_status = goal_hitbox.get_at((int(self.x + self.radius), int(self.y + self.radius))) != WHITE
-        if goal_status:
-            self.vx = 0
-            self.vy = 0
-            self.goal_status = True
-            counter = 0
-            x_bomb = 0
-            y_bomb = 0
-            for ball in game.balls:
-                x_bomb += ball.x
-                y_bomb += ball.y
-                counter += 1
-            x_bomb /= counter
-            y_bomb /= counter
-            game.bomb_countdown_start_time = pygame.time.get_ticks()
-            game.x_bomb = x_bomb
-            game.y_bomb = y_bomb
-            game.bomb_flag = True
-
-
-
-
 class Cue:
     def __init__(self, object_folder):
-        self.image_original = pygame.image.load(f'{object_folder}/cue/cue.png').convert_alpha()
+        self.folder = object_folder
+        self.image_original = assets[(object_folder, "cue")]
         self.image = self.image_original
-        self.strikeline_images = [pygame.image.load(f'{object_folder}/cue/strikeline_{i}.png').convert_alpha() for i in range(10)]
         self.length = int(self.image_original.get_width())
         self.angle = 0
         self.distance_to_ball = 0
@@ -190,10 +61,9 @@ class Cue:
             wobble_offset = 0
         self.angle = true_angle + wobble_offset
 
-    def check_status(self, balls):
-        main_ball = balls[0]
+    def check_status(self, main_ball, total_v):
         main_ball_v = sqrt(main_ball.vx**2 + main_ball.vy**2)
-        if (game.total_v < self.display_threshold) and main_ball_v < self.display_threshold:
+        if (total_v < self.display_threshold) and main_ball_v < self.display_threshold:
             self.ready_status = True
 
 
@@ -206,29 +76,26 @@ class Cue:
 
     def draw(self, main_ball, screen):
         if self.ready_status and not game.win_con:
-            rotated_cue = pygame.transform.rotate(self.image_original, -degrees(self.angle))
-            rotated_rect_cue = rotated_cue.get_rect()
-            self.image = pygame.transform.smoothscale(rotated_cue, (rotated_rect_cue.width, rotated_rect_cue.height))
+            self.image = rotations.rotated((self.folder, "cue"), -degrees(self.angle))
+            rotated_rect_cue = self.image.get_rect()
             self.x = main_ball.x + main_ball.radius - (self.length/2 + self.distance_to_ball)*cos(self.angle) - rotated_rect_cue.width // 2
             self.y = main_ball.y + main_ball.radius - (self.length/2 + self.distance_to_ball)*sin(self.angle) - rotated_rect_cue.height // 2
             screen.blit(self.image, (self.x, self.y))
 
             if self.striking:
                 n = round(self.distance_to_ball / self.max_distance_to_ball * 9)
-                strikeline_image = self.strikeline_images[n]
-                strikeline_length = int(strikeline_image.get_width())
-                strikeline_image_rotated = pygame.transform.rotate(strikeline_image, -degrees(self.angle))
+                strikeline_length = int(assets[(self.folder, "strikeline", n)].get_width())
+                strikeline_image_rotated = rotations.rotated((self.folder, "strikeline", n), -degrees(self.angle))
                 rotated_strikeline_rect = strikeline_image_rotated.get_rect()
                 strikeline_x = (main_ball.x + main_ball.radius) - (self.distance_to_ball - strikeline_length/2)*cos(self.angle) - rotated_strikeline_rect.width // 2
                 strikeline_y = (main_ball.y + main_ball.radius) - (self.distance_to_ball - strikeline_length/2)*sin(self.angle) - rotated_strikeline_rect.height // 2
                 screen.blit(strikeline_image_rotated, (strikeline_x, strikeline_y))
 
 
-    def strike(self, main_ball):
+    def strike(self, simulation):
         if self.ready_status:
             self.striking = True
-            main_ball.vx = self.strike_force*cos(self.angle)
-            main_ball.vy = self.strike_force*sin(self.angle)
+            simulation.strike(self.angle, self.strike_force)
             self.displacement = 0
             self.striking = False
             self.ready_status = False
@@ -238,67 +105,57 @@ class Cue:
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, computer_players=(), planning_time=1.0, replay_folder=None, profile_path=None, aim_assist=False):
+        self.startup_time = time.perf_counter()
+        self.time_to_first_frame = None
         self.screen_width = 960
         self.screen_height = 540
         self.screen = pygame.display.set_mode((self.screen_width, self.screen_height), pygame.SCALED)
         pygame.display.set_caption("ANARCHY POOL")
 
-        self.background = pygame.image.load("background/background.png").convert()
-        self.startscreen_background = pygame.image.load("startscreen/startscreen_background.png").convert()
-
-        self.background_hitbox = pygame.image.load("background/background_hitbox.png").convert()
-        self.goal_hitbox = pygame.image.load("background/goal_hitbox.png").convert()
-
-        self.startscreen_clickbox = pygame.image.load("startscreen/startscreen_clickbox.png").convert()
-        self.menu_mini_clickbox = pygame.image.load("menu/menu_mini/menu_mini_clickbox.png")
-        self.rules_clickbox = pygame.image.load("menu/rules/rules_clickbox.png").convert_alpha()
-        self.about_clickbox = pygame.image.load("menu/about/about_clickbox.png").convert_alpha()
-        self.menu_detailed_clickbox = pygame.image.load("menu/menu_detailed/menu_detailed_clickbox.png")
-        self.pause_region = pygame.image.load("menu/pause_region.png")
+        assets.load()
+
+        self.background = assets[("background", "background")]
+        self.startscreen_background = assets[("startscreen", "startscreen_background")]
+        self.renderer = DirtyRenderer(self.screen, self.background)
+        self.startscreen_renderer = DirtyRenderer(self.screen, self.startscreen_background)
+        self.table_layer = Layer("table", opaque=True)
+        self.hud_layer = Layer("hud")
+
+        self.table = Table.load()
+        self.sim = PoolSimulation(self.table)
+        self.sim.continuous = True
+        self.profiler = FrameProfiler()
+        self.sim.profiler = self.profiler
+        self.profile_path = profile_path
+
+        self.pointer = Pointer({
+            "startscreen": HitMap.load("startscreen/startscreen_clickbox.png", {"2_players": RED, "3_players": GREEN, "4_players": BLUE, "play": YELLOW, "exit": WHITE}),
+            "menu_mini": HitMap.load("menu/menu_mini/menu_mini_clickbox.png", {"menu": RED, "restart": GREEN}),
+            "menu_detailed": HitMap.load("menu/menu_detailed/menu_detailed_clickbox.png", {"rules": RED, "about": GREEN, "exit": BLUE}),
+            "rules": HitMap.load("menu/rules/rules_clickbox.png", {"close": RED}),
+            "pause": HitMap.load("menu/pause_region.png", {"pause": WHITE}),
+        }, pygame.mouse.get_pos())
 
         self.goal_animation_duration = 500
         self.goal_num_frames = 24
-        self.goal_positions = [
-            (63, 87),
-            (418, 80),
-            (773,87),
-            (63, 454),
-            (418, 460),
-            (773, 454),
-        ]
-        self.x_main_start, self.y_main_start = (210, 260)
-        self.x_leftmost_ball_start, self.y_leftmost_ball_start = (560, 260)
-        self.offset_extra = 1
 
         self.teleport = False
         self.teleport_animation_duration = 500
         self.teleport_start_time = 0
         self.teleport_x_start = 0
         self.teleport_y_start = 0
-        self.teleport_x_end = self.x_main_start
-        self.teleport_y_end = self.y_main_start
+        self.teleport_x_end = self.table.x_main_start
+        self.teleport_y_end = self.table.y_main_start
         
-        self.bomb_flag = False
-        self.explode_flag = False
         self.explosion_animation_flag = False
-        self.bomb_countdown_start_time = 0
         self.explosion_time = 0
-        self.x_bomb = 0
-        self.y_bomb =0
 
         self.player_number = 0
         self.player_number_init = 0
         
-        self.players_start = ["player_1", "player_2", "player_3", "player_4", "house"]
-        self.players = self.players_start
-        self.cue = Cue(self.players[0])
-        self.active_player_index = 0
-        self.ball_ownership = []
-        self.balls = []
-        self.main_ball = None
+        self.cue = Cue(self.sim.players[0])
         self.total_v = 0
-        self.scored_this_turn = False
         self.win_con = False
         self.paused = False
         self.start_flag = False
@@ -309,218 +166,314 @@ class Game:
         self.about_opened = False
         self.click = False
 
-        self.clock = pygame.time.Clock()
+        self.computer_players = set(computer_players)
+        self.planner = ShotPlanner(time_budget=planning_time) if self.computer_players else None
+        self.planning = ThreadPoolExecutor(max_workers=1) if self.computer_players else None
+        self.computer_plan = None
+        self.computer_strike_time = None
+        self.computer_aim_duration = 400
+
+        self.aim_assist = AimAssist()
+        self.show_aim_assist = aim_assist
+
+        self.replay_folder = replay_folder
+        self.replay = None
+        self.replay_path = None
+
+        self.scheduler = FrameScheduler()
+        self.timestep = FixedTimestep()
+        self.previous_positions = {}
         self.running = True
+        self.constructor_time = time.perf_counter() - self.startup_time
 
 
     def run(self):
+        profiler = self.profiler
         while self.running:
-            if (self.startscreen_flag == True):
-                self.show_and_monitor_startscreen(self.screen)
-                self.clock.tick(60)
+            with profiler.section("frame"):
+                if (self.startscreen_flag == True):
+                    with profiler.section("startscreen"):
+                        self.show_and_monitor_startscreen(self.startscreen_renderer)
+                else:
+                    if self.start_flag:
+                        with profiler.section("rack"):
+                            self.balls_start()
+                    self.check_for_pause()
+                    with profiler.section("events"):
+                        self.handle_events()
+                    with profiler.section("render"):
+                        self.update_screen_game()
+                    with profiler.section("rules"):
+                        self.get_total_speed()
+                        self.check_turn_switch()
+                        self.check_win_con()
+                    with profiler.section("computer"):
+                        self.play_computer_turn()
+                if self.time_to_first_frame is None:
+                    self.time_to_first_frame = time.perf_counter() - self.startup_time
+                    print(f"startup: constructor {self.constructor_time * 1000:.0f} ms, first frame {self.time_to_first_frame * 1000:.0f} ms, {assets.report()}")
+                with profiler.section("asset streaming"):
+                    profiler.count("asset loads", assets.pump())
+            renderer = self.startscreen_renderer if self.startscreen_flag else self.renderer
+            profiler.count("blits", renderer.blits)
+            profiler.count("pixels", renderer.pixels)
+            profiler.end_frame()
+            if self.startscreen_flag:
+                self.scheduler.wait(not assets.pending, self.next_startscreen_frame())
             else:
-                if self.start_flag:
-                    self.balls_start()
-                self.check_for_pause()
-                self.handle_events()
-                self.update_screen_game()
-                self.handle_collisions()
-                self.get_total_speed()
-                self.check_turn_switch()
-                self.remove_player()
-                self.check_win_con(self.players)
-            self.clock.tick(60)
+                self.scheduler.wait(self.table_idle())
+        if self.planner:
+            self.planning.shutdown(wait=False, cancel_futures=True)
+            self.planner.close()
+        self.save_replay()
+        if self.profile_path:
+            self.profiler.dump(self.profile_path)
+        print(self.scheduler.report())
+        print(self.timestep.report())
+        print(rotations.report())
+        print(self.aim_assist.report())
+        print(f"layers: {self.table_layer.report()}, {self.hud_layer.report()}, dynamic changed {self.renderer.changed_frames} of {self.renderer.frames} frames")
         pygame.quit()
 
 
+    def table_idle(self):
+        animating = self.teleport or self.explosion_animation_flag or self.goal_animations or self.cue.striking
+        aiming = self.show_aim_assist and self.cue.ready_status and self.aim_assist.refining
+        return not (animating or aiming or assets.pending or self.start_flag or self.sim.in_motion())
+
+
+    def next_startscreen_frame(self):
+        # The jumping ball has the shortest frames; the other animations
+        # pick up their next frame on one of its boundaries.
+        period = 3000 // 114
+        return period - pygame.time.get_ticks() % period
+
+
     def handle_events(self):
         self.click = False
         if self.paused:
+            self.timestep.reset()
             for event in pygame.event.get():
+                self.pointer.handle(event)
                 if event.type == pygame.QUIT:
                     self.running = False
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    self.profiler.toggle()
                 if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                     self.click = True
-                    if (self.open_close_menu):
+                    if self.pointer.over("menu_mini", "menu"):
                         if not self.menu_opened:
                             self.menu_opened = True
                         else:
                             self.menu_opened = False
 
-                    if (self.rules_close):
+                    if self.pointer.over("rules", "close"):
                         self.rules_opened = False
 
                     if (self.about_opened):
                         self.about_opened = False
         if not self.paused:
+            human_turn = not self.computer_turn()
             for event in pygame.event.get():
+                self.pointer.handle(event)
                 if event.type == pygame.QUIT:
                     self.running = False
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F4:
+                    self.show_aim_assist = not self.show_aim_assist
+                if not human_turn:
+                    continue
                 if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                     if (self.cue.ready_status):
                         self.cue.striking = True
-                        self.cue.calculate_force(self.main_ball)
+                        self.cue.calculate_force(self.sim.main_ball)
                 if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                     if self.cue.ready_status:
-                        self.cue.strike(self.main_ball)
+                        self.cue.strike(self.sim)
+            main_ball = self.sim.main_ball
             keys = pygame.key.get_pressed()
             if keys[pygame.K_LEFT]:
-                self.main_ball.ax = -self.main_ball.acceleration
+                main_ball.ax = -main_ball.acceleration
             elif keys[pygame.K_RIGHT]:
-                self.main_ball.ax = self.main_ball.acceleration
-            elif keys[pygame.K_SPACE]:
-               self.cue.strike(self.main_ball)
+                main_ball.ax = main_ball.acceleration
+            elif keys[pygame.K_SPACE] and human_turn:
+               self.cue.strike(self.sim)
             else:
-                self.main_ball.ax = 0
+                main_ball.ax = 0
             if keys[pygame.K_UP]:
-                self.main_ball.ay = -self.main_ball.acceleration
+                main_ball.ay = -main_ball.acceleration
             elif keys[pygame.K_DOWN]:
-                self.main_ball.ay = self.main_ball.acceleration
+                main_ball.ay = main_ball.acceleration
             else:
-                self.main_ball.ay = 0
-            if self.cue.ready_status:
-                self.cue.calculate_force(self.main_ball)
-            if self.explode_flag:
-                    self.explosion(self.x_bomb, self.y_bomb)
-            self.monitor_balls()
-            self.cue.check_status(self.balls)
-            self.cue.get_angle(self.main_ball)
+                main_ball.ay = 0
+            if self.cue.ready_status and human_turn:
+                self.cue.calculate_force(main_ball)
+            self.step_physics(main_ball)
+            self.handle_simulation_events()
+            self.cue.check_status(main_ball, self.total_v)
+            if human_turn:
+                self.cue.get_angle(main_ball)
+
+
+    def step_physics(self, main_ball):
+        # Every step is followed by remove_player and the turn rules run
+        # once the frame's steps are done, the order the replay applies
+        # them in.
+        steps = self.timestep.advance()
+        with self.profiler.section("physics"):
+            for step in range(steps):
+                if step == steps - 1:
+                    self.previous_positions = {ball.slot: (ball.x, ball.y) for ball in self.sim.balls}
+                if self.replay:
+                    self.replay.accelerate(self.sim.tick, main_ball.ax, main_ball.ay)
+                self.sim.step()
+                self.sim.remove_player()
+        if any(event['type'] == 'teleport' for event in self.sim.events):
+            self.previous_positions.pop(main_ball.slot, None)
+        if not self.sim.in_motion():
+            self.timestep.reset()
+        self.profiler.count("physics steps", steps)
+
+
+    def draw_position(self, ball):
+        # Balls are drawn between the last two steps, as far along as the
+        # real time left over after them.
+        previous = self.previous_positions.get(ball.slot)
+        if previous is None:
+            return ball.x, ball.y
+        alpha = self.timestep.alpha()
+        return previous[0] + (ball.x - previous[0]) * alpha, previous[1] + (ball.y - previous[1]) * alpha
+
+
+    def computer_turn(self):
+        return self.sim.active_player() in self.computer_players and not self.win_con
+
+
+    def play_computer_turn(self):
+        # Planning runs on a helper thread, which hands the shots out to
+        # the planner's worker processes, so frames keep coming meanwhile.
+        if self.paused or not self.computer_turn() or not self.cue.ready_status or self.cue.has_stricken:
+            return
+        if self.computer_plan is None:
+            self.computer_plan = self.planning.submit(self.planner.plan, self.sim.copy())
+        elif self.computer_strike_time is None:
+            if self.computer_plan.done():
+                self.cue.angle, self.cue.strike_force = self.computer_plan.result()
+                self.cue.distance_to_ball = self.cue.max_distance_to_ball * self.cue.strike_force / self.cue.max_force
+                self.cue.striking = True
+                self.computer_strike_time = pygame.time.get_ticks() + self.computer_aim_duration
+        elif pygame.time.get_ticks() >= self.computer_strike_time:
+            self.cue.strike(self.sim)
+            self.computer_plan = None
+            self.computer_strike_time = None
+
+
+    def handle_simulation_events(self):
+        for event in self.sim.events:
+            if event['type'] == 'goal':
+                self.goal_animations.append({
+                    'coords': event['coords'],
+                    'pocket': event['pocket'],
+                    'start_time': pygame.time.get_ticks(),
+                    'owner': event['owner']
+                })
+            elif event['type'] == 'teleport':
+                self.teleport = True
+                self.teleport_start_time = pygame.time.get_ticks()
+                self.teleport_x_start, self.teleport_y_start = event['coords']
+            elif event['type'] == 'explosion':
+                self.explosion_animation_flag = True
+                self.explosion_time = pygame.time.get_ticks()
+            elif event['type'] == 'strike' and self.replay:
+                self.replay.strike(event['tick'], event['angle'], event['force'])
+        self.sim.events.clear()
 
 
     def update_screen_game(self):
-        self.screen.blit(self.background, (0, 0))
-        for ball in self.balls:
-            ball.draw(self.screen)
+        screen = self.renderer
+        if self.table_layer.update(self.background, self.draw_table):
+            screen.background = self.table_layer.surface
+            screen.invalidate()
+        for ball in self.sim.balls:
+            screen.blit(assets[(ball.owner, ball.sprite)], self.draw_position(ball))
+        if self.show_aim_assist and self.cue.ready_status and not self.win_con and not self.computer_turn():
+            with self.profiler.section("aim assist"):
+                self.aim_assist.draw(screen, self.sim, self.cue.angle, self.cue.strike_force)
         if not self.win_con:
-            self.cue.draw(self.main_ball, self.screen)
+            self.cue.draw(self.sim.main_ball, screen)
         else:
-            self.show_winscreen(self.screen)
+            self.show_winscreen(screen)
         if self.teleport:
             current_time = pygame.time.get_ticks()
             elapsed_time = current_time - self.teleport_start_time
             if elapsed_time <= self.teleport_animation_duration:
-                self.main_ball_teleporting_animation(self.screen, elapsed_time, self.teleport_x_start, self.teleport_y_start, self.teleport_x_end, self.teleport_y_end)
+                self.main_ball_teleporting_animation(screen, elapsed_time, self.teleport_x_start, self.teleport_y_start, self.teleport_x_end, self.teleport_y_end)
             else:
                 self.teleport = False
-        if self.bomb_flag:
-            self.display_bomb_countdown_animation(self.screen, self.x_bomb, self.y_bomb)
+        if self.sim.bomb_flag:
+            self.display_bomb_countdown_animation(screen, self.sim.x_bomb, self.sim.y_bomb)
         if self.explosion_animation_flag:
-            self.display_explosion(self.screen, self.x_bomb, self.y_bomb)
-        self.display_goal_animation(self.screen)
-        self.show_and_monitor_menu(self.screen)
-        self.show_and_update_turn_indicators_and_healthbars(self.screen)
-        pygame.display.update()
+            self.display_explosion(screen, self.sim.x_bomb, self.sim.y_bomb)
+        self.display_goal_animation(screen)
+        with self.profiler.section("menu"):
+            self.monitor_menu()
+        with self.profiler.section("hud"):
+            if self.hud_layer.update(self.hud_key(), self.draw_hud):
+                self.profiler.count("layer redraws")
+            self.hud_layer.draw(screen)
+        self.profiler.draw(screen)
+        with self.profiler.section("present"):
+            screen.present()
 
 
 
     def balls_start(self):
-        self.players = self.players_start
-        self.balls = []
-        self.cue = Cue(self.players[0])
-        default_ball = pygame.image.load("house/balls/idle.png").convert()
-        r = default_ball.get_height()/2
-        offset_x = 2 * sin(3.1415 / 3) * r
-        offset_y = 2 * cos(3.1415 / 3) * r
-        x1, y1 = (self.x_leftmost_ball_start, self.y_leftmost_ball_start)
-        x2, y2 = (x1 + offset_x + self.offset_extra, y1 - offset_y - self.offset_extra)
-        x3, y3 = (x1 + offset_x + self.offset_extra, y1 + offset_y + self.offset_extra)
-        x4, y4 = (x1 + 2 * (offset_x + self.offset_extra), y1 - 2 * (offset_y + self.offset_extra))
-        x5, y5 = (x1 + 2 * (offset_x + self.offset_extra), y1 + 2 * (offset_y + self.offset_extra))
-        x6, y6 = (x1 + 2 * (offset_x + self.offset_extra), y1)
-        x7, y7 = (x1 + 3 * (offset_x + self.offset_extra), y1 - (offset_y + self.offset_extra))
-        x8, y8 = (x1 + 3 * (offset_x + self.offset_extra), y1 + (offset_y + self.offset_extra))
-        x9, y9 = (x1 + 3 * (offset_x + self.offset_extra), y1 - 3 * (offset_y + self.offset_extra))
-        x10, y10 = (x1 + 3 * (offset_x + self.offset_extra), y1 + 3 * (offset_y + self.offset_extra))
-        x11, y11 = (x1 + 4 * (offset_x + self.offset_extra), y1 + 4 * (offset_y + self.offset_extra))
-        x12, y12 = (x1 + 4 * (offset_x + self.offset_extra), y1 + 2 * (offset_y + self.offset_extra))
-        x13, y13 = (x1 + 4 * (offset_x + self.offset_extra), y1 - 4 * (offset_y + self.offset_extra))
-        x14, y14 = (x1 + 4 * (offset_x + self.offset_extra), y1 - 2 * (offset_y + self.offset_extra))
-        x15, y15 = (x1 + 4 * (offset_x + self.offset_extra), y1)
-        x_list = [x1, x2, x3, x4, x5, x6, x7, x8, x9, x10, x11, x12, x13, x14, x15]
-        y_list = [y1, y2, y3, y4, y5, y6, y7, y8, y9, y10, y11, y12, y13, y14, y15]
-        combined_list = list(zip(x_list, y_list))
-        random.shuffle(combined_list)
-        x_list, y_list = zip(*combined_list)
-        x_list = list(x_list)
-        y_list = list(y_list)
-        if self.player_number == 2:
-            self.ball_ownership = [0, 1, 1, 1, 1, 1, 1, 0, 0, 2, 2, 2, 2, 2, 2, 0]
-        if self.player_number == 3:
-            self.ball_ownership = [0, 1, 1, 1, 1, 2, 2, 2, 0, 2, 3, 3, 3, 3, 0, 0]
-        if self.player_number == 4:
-            self.ball_ownership = [0, 1, 1, 1, 2, 2, 2, 3, 0, 3, 3, 4, 4, 4, 0, 0]
-        white_flag = False
-        for i in range(16):
-            if self.ball_ownership[i] != 0:
-                ball = Ball(self.players[self.ball_ownership[i] - 1], x_list[i - 1], y_list[i - 1])
-            elif self.ball_ownership[i] == 0:
-                if not white_flag:
-                    ball = MainBall(self.players[-1], self.x_main_start, self.y_main_start, self.x_main_start, self.y_main_start)
-                    self.main_ball = ball
-                    white_flag = True
-                else:
-                    ball = FunBall(self.players[-1], x_list[i - 1], y_list[i - 1])
-            self.balls.append(ball)
+        self.save_replay()
+        seed = random.getrandbits(64)
+        self.sim.rack(self.player_number, seed)
+        if self.replay_folder:
+            self.replay = Replay(self.player_number, seed, self.sim.continuous)
+            self.replay_path = os.path.join(self.replay_folder, time.strftime("%Y%m%d-%H%M%S") + f"-{seed % 10000:04d}.replay")
+        self.cue = Cue(self.sim.players[0])
+        # A plan still pending was made for the old rack; its result is
+        # dropped with it.
+        self.computer_plan = None
+        self.computer_strike_time = None
+        self.previous_positions = {}
+        self.timestep.reset()
+        self.renderer.invalidate()
         self.start_flag = False
 
 
-    def handle_collisions(self):
-        for i in range(len(self.balls)):
-            for j in range(i + 1, len(self.balls)):
-                self.balls[i].check_collision(self.balls[j])
-
-
-    def remove_player(self):
-        players_left = []
-        for ball in self.balls:
-            if (ball.owner not in players_left) and (ball.owner != "house"):
-                players_left.append(ball.owner)
-        players_left.sort()
-        self.players = players_left
+    def save_replay(self):
+        if self.replay:
+            self.replay.final_tick = self.sim.tick
+            os.makedirs(self.replay_folder, exist_ok=True)
+            self.replay.save(self.replay_path)
+            self.replay = None
 
 
     def main_ball_teleporting_animation(self, screen, elapsed_time, x, y, x_end, y_end):
         num_frames = 10
         frame_index = (elapsed_time % self.teleport_animation_duration) // (self.teleport_animation_duration // num_frames)
         try:
-            current_image = pygame.image.load(f"house/balls/teleport_animation/teleport_{frame_index}.png").convert_alpha()
+            current_image = assets[("house", "teleport", frame_index)]
             screen.blit(current_image, (x - int(current_image.get_width() / 2), y - int(current_image.get_height() / 2)))
             screen.blit(current_image, (x_end - int(current_image.get_width() / 2), y_end - int(current_image.get_height() / 2)))
-        except (FileNotFoundError, UnboundLocalError):
+        except KeyError:
             pass
 
 
     def display_bomb_countdown_animation(self, screen, x, y):
-        countdown_duration = 1500
         num_frames = 24
-        start_time = self.bomb_countdown_start_time
-        current_time = pygame.time.get_ticks()
-        frame_index = int(current_time - start_time)//(countdown_duration // num_frames)
+        countdown_steps = self.sim.bomb_countdown_steps
+        frame_index = (countdown_steps - self.sim.bomb_timer) * num_frames // countdown_steps
         try:
-            current_image = pygame.image.load(f"house/balls/explosion/countdown_{frame_index}.png").convert_alpha()
+            current_image = assets[("house", "countdown", frame_index)]
             screen.blit(current_image, (x - current_image.get_width() // 2, y - current_image.get_height() // 2))
-        except FileNotFoundError:
+        except KeyError:
             pass
-        if current_time - start_time >= countdown_duration:
-            self.explode_flag = True
-            
-
-    def explosion(self, x_bomb, y_bomb):
-        explosion_radius = 300
-        explosion_force = 200
-        self.explosion_animation_flag = True
-        for ball in self.balls:
-            distance_x = ball.x - x_bomb
-            distance_y = ball.y - y_bomb
-            distance = (distance_x ** 2 + distance_y ** 2) ** 0.5
-            if distance < explosion_radius:
-                force = explosion_force * (1 - distance / explosion_radius)
-                angle = atan2(distance_y, distance_x)
-                ball.vx += force * cos(angle) / ball.mass
-                ball.vy += force * sin(angle) / ball.mass
-        self.explosion_time = pygame.time.get_ticks()
-        self.bomb_flag = False
-        self.explode_flag = False
         
 
     def display_explosion(self, screen, x, y):
@@ -531,49 +484,34 @@ class Game:
         frame_index = int(current_time - start_time)//(animation_duration // num_frames)
         if frame_index < num_frames:
             try:
-                current_image = pygame.image.load(f"house/balls/explosion/explosion_{frame_index}.png").convert_alpha()
+                current_image = assets[("house", "explosion", frame_index)]
                 screen.blit(current_image, (x - current_image.get_width() // 2, y - current_image.get_height() // 2))
-            except FileNotFoundError:
+            except KeyError:
                 pass
         if current_time > start_time + animation_duration:
             self.explosion_animation_flag = False
         
 
     def check_turn_switch(self):
-        if len(self.players) > 1:
+        if len(self.sim.players) > 1:
             if self.cue.ready_status and self.cue.has_stricken:
-                if not self.scored_this_turn:
-                    if self.active_player_index >= (len(self.players)-1):
-                        self.active_player_index = 0
-                    else:
-                        self.active_player_index += 1
-                    self.cue = Cue(self.players[self.active_player_index])
+                if self.replay:
+                    self.replay.turn(self.sim.tick)
+                if self.sim.check_turn_switch():
+                    self.cue = Cue(self.sim.players[self.sim.active_player_index])
                 self.cue.has_stricken = False
-                self.scored_this_turn = False
 
 
-    def check_win_con(self, players):
-        if (len(players) == 1) and not(self.paused):
+    def check_win_con(self):
+        if self.sim.check_win_con() and not(self.paused):
             self.win_con = True
 
 
     def show_winscreen(self, screen):
         x_winscreen = self.screen_width/2
         y_winscreen = self.screen_height/2
-        player_win_screen = pygame.image.load(f'{self.players[0]}/win_screen.png').convert_alpha()
-        self.screen.blit(player_win_screen, (x_winscreen - player_win_screen.get_width()/2, y_winscreen - player_win_screen.get_height()/2))
-
-
-    def monitor_balls(self):
-        for ball in self.balls:
-            ball.move(self.background_hitbox)
-            ball.check_goal(self.goal_hitbox)
-            try:
-                if (ball.goal_status) and (not isinstance(ball, MainBall)) and (ball.owner != self.players[self.active_player_index]):
-                    self.scored_this_turn = True
-            except IndexError:
-                pass
-        self.balls = [ball for ball in self.balls if not ball.goal_status or isinstance(ball, MainBall)]
+        player_win_screen = assets[(self.sim.players[0], "win_screen")]
+        screen.blit(player_win_screen, (x_winscreen - player_win_screen.get_width()/2, y_winscreen - player_win_screen.get_height()/2))
 
 
     def display_goal_animation(self, screen):
@@ -586,95 +524,125 @@ class Game:
                 elapsed_time = current_time - animation['start_time']
                 current_frame = (elapsed_time // (self.goal_animation_duration // self.goal_num_frames))
                 try:
-                    goal_image = pygame.image.load(f'{animation["owner"]}/balls/goal_{current_frame}.png').convert_alpha()
-                    x, y = animation['coords']
+                    goal_image = assets[(animation["owner"], "goal", current_frame)]
                     image_width = goal_image.get_width()
                     image_height = goal_image.get_height()
-                    closest_position = min(self.goal_positions, key=lambda pos: hypot(pos[0] - x, pos[1] - y))
-                    centered_x = closest_position[0] - image_width // 2
-                    centered_y = closest_position[1] - image_height // 2
+                    pocket_x, pocket_y = self.table.pocket_map.position(animation['pocket'])
+                    centered_x = pocket_x - image_width // 2
+                    centered_y = pocket_y - image_height // 2
                     screen.blit(goal_image, (centered_x, centered_y))
-                except FileNotFoundError:
+                except KeyError:
                     pass
 
 
-    def show_and_monitor_menu(self, screen):
+    def draw_table(self, layer):
+        layer.blit(self.background, (0, 0))
+
+
+    def hud_key(self):
+        # Everything the menu, emblems and health bars are drawn from; the
+        # HUD layer is redrawn only when one of these changes.
+        regions = self.pointer.regions
+        players = tuple(self.sim.players)
+        return (
+            players,
+            self.sim.active_player_index,
+            tuple(self.sim.owners.count(player) for player in players),
+            self.player_number_init,
+            self.menu_opened,
+            self.rules_opened,
+            self.about_opened,
+            regions["menu_mini"] if not self.menu_opened else None,
+            regions["menu_detailed"] if self.menu_opened else None,
+            regions["rules"] if self.rules_opened or self.about_opened else None,
+        )
+
+
+    def draw_hud(self, layer):
+        self.show_menu(layer)
+        self.show_and_update_turn_indicators_and_healthbars(layer)
+
+
+    def monitor_menu(self):
+        if not self.click:
+            return
+        regions = self.pointer.regions
+        restart = regions["menu_mini"] == "restart"
+
+        if self.menu_opened:
+            if regions["menu_detailed"] == "rules":
+                self.menu_opened = False
+                self.rules_opened = True
+
+            elif regions["menu_detailed"] == "about":
+                self.menu_opened = False
+                self.about_opened = True
+
+            elif regions["menu_detailed"] == "exit":
+                self.win_con = False
+                self.startscreen_flag = True
+                self.startscreen_renderer.invalidate()
+                self.player_number = 0
+                self.menu_opened = False
+                self.paused = False
+                self.computer_plan = None
+                self.computer_strike_time = None
+
+        if restart and not self.menu_opened:
+            self.start_flag = True
+            self.win_con = False
+
+
+    def show_menu(self, screen):
         x_menu = 837
         y_menu = 46
 
         x_rules = 107
         y_rules = 149
 
-        menu_mini = pygame.image.load("menu/menu_mini/menu_mini_0.png").convert_alpha()
-        menu_mini_hovering_menu = pygame.image.load("menu/menu_mini/menu_mini_1.png").convert_alpha()
-        menu_mini_hovering_restart = pygame.image.load("menu/menu_mini/menu_mini_2.png").convert_alpha()
-        menu_detailed_opened = pygame.image.load("menu/menu_detailed/menu_0.png").convert_alpha()
-        menu_detailed_hovering_rules = pygame.image.load("menu/menu_detailed/menu_1.png").convert_alpha()
-        menu_detailed_hovering_about = pygame.image.load("menu/menu_detailed/menu_2.png").convert_alpha()
-        menu_detailed_hovering_exit = pygame.image.load("menu/menu_detailed/menu_3.png").convert_alpha()
+        menu_mini = assets[("menu", "menu_mini", 0)]
+        menu_mini_hovering_menu = assets[("menu", "menu_mini", 1)]
+        menu_mini_hovering_restart = assets[("menu", "menu_mini", 2)]
+        menu_detailed_opened = assets[("menu", "menu", 0)]
+        menu_detailed_hovering_rules = assets[("menu", "menu", 1)]
+        menu_detailed_hovering_about = assets[("menu", "menu", 2)]
+        menu_detailed_hovering_exit = assets[("menu", "menu", 3)]
 
-        rules_idle = pygame.image.load("menu/rules/rules_0.png").convert_alpha()
-        rules_hover_close = pygame.image.load("menu/rules/rules_1.png").convert_alpha()
+        rules_idle = assets[("menu", "rules", 0)]
+        rules_hover_close = assets[("menu", "rules", 1)]
 
-        about_idle = pygame.image.load("menu/about/about_0.png").convert_alpha()
-        about_hover_close = pygame.image.load("menu/about/about_1.png").convert_alpha()
-
-        x_cursor, y_cursor = pygame.mouse.get_pos()
-     
-        self.rules_close = (self.rules_clickbox.get_at((int(x_cursor), int(y_cursor))) == RED)
-        self.open_close_menu = (self.menu_mini_clickbox.get_at((int(x_cursor), int(y_cursor))) == RED)
-        restart = self.menu_mini_clickbox.get_at((int(x_cursor), int(y_cursor))) == GREEN 
+        about_idle = assets[("menu", "about", 0)]
+        about_hover_close = assets[("menu", "about", 1)]
 
-        if self.menu_opened:
-            open_rules = self.menu_detailed_clickbox.get_at((int(x_cursor), int(y_cursor))) == RED
-            open_about_page = self.menu_detailed_clickbox.get_at((int(x_cursor), int(y_cursor))) == GREEN
-            finish_game = self.menu_detailed_clickbox.get_at((int(x_cursor), int(y_cursor))) == BLUE
+        regions = self.pointer.regions
+        rules_close = regions["rules"] == "close"
 
         if not self.menu_opened:
             screen.blit(menu_mini, (x_menu, y_menu))
-            if (self.open_close_menu):
+            if regions["menu_mini"] == "menu":
                 screen.blit(menu_mini_hovering_menu, (x_menu, y_menu))
-        
+            if regions["menu_mini"] == "restart":
+                screen.blit(menu_mini_hovering_restart, (x_menu, y_menu))
+
         if self.menu_opened:
             screen.blit(menu_detailed_opened, (x_menu, y_menu))
-
-            if open_rules:
+            if regions["menu_detailed"] == "rules":
                 screen.blit(menu_detailed_hovering_rules, (x_menu, y_menu))
-                if self.click:
-                    self.menu_opened = False
-                    self.rules_opened = True
-
-            if open_about_page:
+            if regions["menu_detailed"] == "about":
                 screen.blit(menu_detailed_hovering_about, (x_menu, y_menu))
-                if self.click:
-                    self.menu_opened = False
-                    self.about_opened = True
-
-            if finish_game:
+            if regions["menu_detailed"] == "exit":
                 screen.blit(menu_detailed_hovering_exit, (x_menu, y_menu))
-                if self.click == True:
-                    self.win_con = False
-                    self.startscreen_flag = True
-                    self.player_number = 0
-                    self.menu_opened = False
-                    self.paused = False
 
         if self.rules_opened:
             screen.blit(rules_idle, (x_rules, y_rules))
-            if self.rules_close:
+            if rules_close:
                 screen.blit(rules_hover_close, (x_rules, y_rules))
 
         if self.about_opened:
             screen.blit(about_idle, (x_rules, y_rules))
-            if self.rules_close:
+            if rules_close:
                 screen.blit(about_hover_close, (x_rules, y_rules))
 
-        if restart and not self.menu_opened:
-            screen.blit(menu_mini_hovering_restart, (x_menu, y_menu))
-            if self.click == True:
-                self.start_flag = True
-                self.win_con = False
-
 
     def show_and_monitor_startscreen(self, screen):
         y_offset_jumping_ball = -80
@@ -696,30 +664,29 @@ class Game:
         y_three_players = self.startscreen_background.get_height()/2 + y_offset_choices
         x_four_players = self.startscreen_background.get_width()/2 + x_offset_choices
         y_four_players = self.startscreen_background.get_height()/2 + y_offset_choices
-        x_cursor, y_cursor = pygame.mouse.get_pos()
-        two_players = pygame.image.load("startscreen/2_players.png").convert_alpha()
-        two_players_hovering = pygame.image.load("startscreen/2_players_hovering.png").convert_alpha()
-        two_players_chosen = pygame.image.load("startscreen/2_players_chosen.png").convert_alpha()
-        two_cues = pygame.image.load("startscreen/2_cues.png").convert_alpha()
-        three_players = pygame.image.load("startscreen/3_players.png").convert_alpha()
-        three_players_hovering = pygame.image.load("startscreen/3_players_hovering.png").convert_alpha()
-        three_players_chosen = pygame.image.load("startscreen/3_players_chosen.png").convert_alpha()
-        three_cues = pygame.image.load("startscreen/3_cues.png").convert_alpha()
-        four_players = pygame.image.load("startscreen/4_players.png").convert_alpha()
-        four_players_hovering = pygame.image.load("startscreen/4_players_hovering.png").convert_alpha()
-        four_players_chosen = pygame.image.load("startscreen/4_players_chosen.png").convert_alpha()
-        four_cues = pygame.image.load("startscreen/4_cues.png").convert_alpha()
-        play_button = pygame.image.load("startscreen/play_button.png").convert_alpha()
-        play_button_hovering = pygame.image.load("startscreen/play_button_hovering.png").convert_alpha()
-        exit_button = pygame.image.load("startscreen/exit_button.png").convert_alpha()
-        exit_button_hovering = pygame.image.load("startscreen/exit_button_hovering.png").convert_alpha()
-        choose_player_number_tip = pygame.image.load("startscreen/choose_button_default.png").convert_alpha()
-        two_players_hover_flag = self.startscreen_clickbox.get_at((int(x_cursor), int(y_cursor))) == RED
-        three_players_hover_flag = self.startscreen_clickbox.get_at((int(x_cursor), int(y_cursor))) == GREEN
-        four_players_hover_flag = self.startscreen_clickbox.get_at((int(x_cursor), int(y_cursor))) == BLUE
-        play_button_hover_flag = self.startscreen_clickbox.get_at((int(x_cursor), int(y_cursor))) == YELLOW
-        choose_exit = self.startscreen_clickbox.get_at((int(x_cursor), int(y_cursor))) == WHITE
-        screen.blit(self.startscreen_background, (0, 0))
+        two_players = assets[("startscreen", "2_players")]
+        two_players_hovering = assets[("startscreen", "2_players_hovering")]
+        two_players_chosen = assets[("startscreen", "2_players_chosen")]
+        two_cues = assets[("startscreen", "2_cues")]
+        three_players = assets[("startscreen", "3_players")]
+        three_players_hovering = assets[("startscreen", "3_players_hovering")]
+        three_players_chosen = assets[("startscreen", "3_players_chosen")]
+        three_cues = assets[("startscreen", "3_cues")]
+        four_players = assets[("startscreen", "4_players")]
+        four_players_hovering = assets[("startscreen", "4_players_hovering")]
+        four_players_chosen = assets[("startscreen", "4_players_chosen")]
+        four_cues = assets[("startscreen", "4_cues")]
+        play_button = assets[("startscreen", "play_button")]
+        play_button_hovering = assets[("startscreen", "play_button_hovering")]
+        exit_button = assets[("startscreen", "exit_button")]
+        exit_button_hovering = assets[("startscreen", "exit_button_hovering")]
+        choose_player_number_tip = assets[("startscreen", "choose_button_default")]
+        region = self.pointer.regions["startscreen"]
+        two_players_hover_flag = region == "2_players"
+        three_players_hover_flag = region == "3_players"
+        four_players_hover_flag = region == "4_players"
+        play_button_hover_flag = region == "play"
+        choose_exit = region == "exit"
         self.blit_jumping_ball_animation(screen, x_jumping_ball, y_jumping_ball)
         screen.blit(exit_button, (x_exit_button, y_exit_button))
         if self.player_number == 2:
@@ -752,24 +719,29 @@ class Game:
         if choose_exit:
             screen.blit(exit_button_hovering, (x_exit_button, y_exit_button))
         for event in pygame.event.get():
+            self.pointer.handle(event)
             if event.type == pygame.QUIT:
                 self.running = False
             if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
-                if choose_exit:
+                region = self.pointer.regions["startscreen"]
+                if region == "exit":
                     self.running = False
-                if two_players_hover_flag:
+                if region == "2_players":
                     self.player_number = 2
                     self.player_number_init = 2
-                if three_players_hover_flag:
+                if region == "3_players":
                     self.player_number = 3
                     self.player_number_init = 3
-                if four_players_hover_flag:
+                if region == "4_players":
                     self.player_number = 4
                     self.player_number_init = 4
-                if (play_button_hover_flag) and (self.player_number > 1):
+                if (region == "play") and (self.player_number > 1):
                     self.start_flag = True
                     self.startscreen_flag = False
-        pygame.display.update()
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.profiler.toggle()
+        self.profiler.draw(screen)
+        screen.present()
 
 
     def blit_choose_player_number_tip_animation(self, screen, x, y):
@@ -777,7 +749,7 @@ class Game:
         num_frames = 20
         current_time = pygame.time.get_ticks()
         frame_index = (current_time % animation_duration) // (animation_duration // num_frames)
-        current_image = pygame.image.load(f"startscreen/player_number_tip_{frame_index}.png").convert_alpha()
+        current_image = assets[("startscreen", "player_number_tip", frame_index)]
         screen.blit(current_image, (x, y))
 
 
@@ -786,7 +758,7 @@ class Game:
         num_frames = 20
         current_time = pygame.time.get_ticks()
         frame_index = (current_time % animation_duration) // (animation_duration // num_frames)
-        current_image = pygame.image.load(f"startscreen/play_button_{frame_index}.png").convert_alpha()
+        current_image = assets[("startscreen", "play_button", frame_index)]
         screen.blit(current_image, (x, y))
 
 
@@ -796,12 +768,9 @@ class Game:
         current_time = pygame.time.get_ticks()
         frame_index = (current_time % animation_duration) // (animation_duration // num_frames)
         try:
-            current_image = pygame.image.load(f"startscreen/jump_{frame_index}.png").convert_alpha()
-        except FileNotFoundError:
-            pass
-        try:
+            current_image = assets[("startscreen", "jump", frame_index)]
             screen.blit(current_image, (x - int(current_image.get_width()/2), y - int(current_image.get_height()/2)))
-        except UnboundLocalError:
+        except KeyError:
             pass
 
 
@@ -816,17 +785,17 @@ class Game:
         }
         y_healthbar_offset = 30
 
-        player_1 = pygame.image.load("player_1/emblem.png").convert_alpha()
-        player_1_active = pygame.image.load("player_1/emblem_active.png").convert_alpha()
+        player_1 = assets[("player_1", "emblem")]
+        player_1_active = assets[("player_1", "emblem_active")]
         
-        player_2 = pygame.image.load("player_2/emblem.png").convert_alpha()
-        player_2_active = pygame.image.load("player_2/emblem_active.png").convert_alpha()
+        player_2 = assets[("player_2", "emblem")]
+        player_2_active = assets[("player_2", "emblem_active")]
 
-        player_3 = pygame.image.load("player_3/emblem.png").convert_alpha()
-        player_3_active = pygame.image.load("player_3/emblem_active.png").convert_alpha()
+        player_3 = assets[("player_3", "emblem")]
+        player_3_active = assets[("player_3", "emblem_active")]
 
-        player_4 = pygame.image.load("player_4/emblem.png").convert_alpha()
-        player_4_active = pygame.image.load("player_4/emblem_active.png").convert_alpha()
+        player_4 = assets[("player_4", "emblem")]
+        player_4_active = assets[("player_4", "emblem_active")]
 
         player_emblems = {
             "player_1": player_1,
@@ -842,37 +811,33 @@ class Game:
             "player_4": player_4_active
         }
 
-        for player in self.players:
+        for player in self.sim.players:
             if player != "house":
                 screen.blit(player_emblems[player], (x_player_emblem, y_player_emblems[player]))
                 screen.blit(self.get_healthbar(player), (x_player_emblem, y_player_emblems[player] + y_healthbar_offset))
                 try:
-                    if self.players[self.active_player_index] == player:
+                    if self.sim.players[self.sim.active_player_index] == player:
                         screen.blit(player_emblems_active[player], (x_player_emblem, y_player_emblems[player]))
                 except IndexError:
                     pass
 
 
     def get_healthbar(self, player):
-        current_health = 0
         if self.player_number_init == 2:
             max_health = 6
         if self.player_number_init == 3:
             max_health = 4
         if self.player_number_init == 4:
             max_health = 3
-        for ball in self.balls:
-            if player == ball.owner:
-                current_health += 1
+        current_health = self.sim.owners.count(player)
         health_percentage = (current_health / max_health) * 100
         healthbar_index = min(ceil(health_percentage / 10) * 10, 100)
-        healthbar_image = pygame.image.load(f"{player}/healthbar/healthbar_{healthbar_index}.png").convert_alpha()
+        healthbar_image = assets[(player, "healthbar", healthbar_index)]
         return healthbar_image
 
 
     def check_for_pause(self):
-        x_cursor, y_cursor = pygame.mouse.get_pos()
-        pause_condition = (self.pause_region.get_at((int(x_cursor), int(y_cursor))) == WHITE) or self.win_con
+        pause_condition = self.pointer.over("pause", "pause") or self.win_con
         if pause_condition or self.menu_opened or self.rules_opened or self.about_opened:
             self.paused = True
         else:
@@ -880,12 +845,23 @@ class Game:
 
 
     def get_total_speed(self):
-        total_v = 0
-        for ball in self.balls:
-            total_v += sqrt(ball.vx**2 + ball.vy**2)
-        self.total_v = total_v
+        self.total_v = self.sim.total_speed()
 
 
 if __name__ == "__main__":
-    game = Game()
-    game.run()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--computer", action="append", default=[], metavar="PLAYER", help="let the computer play this seat, e.g. player_2")
+    parser.add_argument("--planning-time", type=float, default=1.0, help="seconds the computer may think per shot")
+    parser.add_argument("--record", metavar="FOLDER", help="save a replay of every game into this folder")
+    parser.add_argument("--profile", metavar="PATH", help="write frame timings to this .csv or .json file on exit")
+    parser.add_argument("--aim-assist", action="store_true", help="show where the cue ball will go while aiming, F4 toggles it")
+    commands = parser.add_subparsers(dest="command")
+    headless = commands.add_parser("headless", help="play games between bots without a window and write the results as JSON Lines")
+    batch.add_arguments(headless)
+    args = parser.parse_args()
+    if args.command == "headless":
+        pygame.quit()
+        batch.main(args)
+    else:
+        game = Game(args.computer, args.planning_time, args.record, args.profile, args.aim_assist)
+        game.run()
@@ -0,0 +1,184 @@
+import numpy as np
+import hashlib
+import os
+
+
+CACHE_DIR = ".hitmap_cache"
+CACHE_VERSION = 1
+MAX_DISTANCE = 64
+
+
+def file_hash(path):
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).hexdigest()
+
+
+def load_cached(path, name, build, cache_dir=CACHE_DIR):
+    cache_path = os.path.join(cache_dir, f"{name}_{file_hash(path)}_v{CACHE_VERSION}.npz")
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as data:
+            return {key: data[key] for key in data.files}
+    # pygame is only needed to build a missing cache, so headless users
+    # of the simulation never have to import it.
+    import pygame
+    arrays = build(pygame.image.load(path))
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_path, **arrays)
+    return arrays
+
+
+def white_mask(surface):
+    import pygame
+    return (pygame.surfarray.array3d(surface) == 255).all(axis=2)
+
+
+def distance_to(features, max_distance):
+    # Exact Euclidean distance to the nearest True pixel, truncated at
+    # max_distance: nearest feature along each column first, then the
+    # best combination over rows at most max_distance away.
+    width, height = features.shape
+    far = max_distance + 1
+    index = np.arange(width)[:, None].repeat(height, axis=1)
+    before = np.where(features, index, -far * 4)
+    before = np.maximum.accumulate(before, axis=0)
+    after = np.where(features, index, width + far * 4)
+    after = np.minimum.accumulate(after[::-1], axis=0)[::-1]
+    column = np.minimum(index - before, after - index).astype(np.float64)
+    column = np.minimum(column, far) ** 2
+    squared = np.full(features.shape, float(far) ** 2)
+    for shift in range(-max_distance, max_distance + 1):
+        if shift < 0:
+            squared[:, :shift] = np.minimum(squared[:, :shift], column[:, -shift:] + shift ** 2)
+        elif shift > 0:
+            squared[:, shift:] = np.minimum(squared[:, shift:], column[:, :-shift] + shift ** 2)
+        else:
+            squared = np.minimum(squared, column)
+    return np.minimum(np.sqrt(squared), max_distance)
+
+
+class DistanceField:
+    def __init__(self, distance, normal_x, normal_y):
+        self.distance = distance
+        self.normal_x = normal_x
+        self.normal_y = normal_y
+        self.width, self.height = distance.shape
+
+    @classmethod
+    def build(cls, surface, max_distance=MAX_DISTANCE):
+        free = white_mask(surface)
+        distance = np.where(free, distance_to(~free, max_distance) - 0.5, 0.5 - distance_to(free, max_distance))
+        gradient_x, gradient_y = np.gradient(distance)
+        length = np.hypot(gradient_x, gradient_y)
+        length[length == 0] = 1
+        return cls(distance.astype(np.float32), (gradient_x / length).astype(np.float32), (gradient_y / length).astype(np.float32))
+
+    @classmethod
+    def load(cls, path, max_distance=MAX_DISTANCE):
+        def build(surface):
+            field = cls.build(surface, max_distance)
+            return {"distance": field.distance, "normal_x": field.normal_x, "normal_y": field.normal_y}
+        arrays = load_cached(path, f"distance_field_{max_distance}", build)
+        return cls(arrays["distance"], arrays["normal_x"], arrays["normal_y"])
+
+    def pixel(self, x, y):
+        return min(max(int(x), 0), self.width - 1), min(max(int(y), 0), self.height - 1)
+
+    def distance_at(self, x, y):
+        return self.distance.item(self.pixel(x, y))
+
+    def normal_at(self, x, y):
+        pixel = self.pixel(x, y)
+        return self.normal_x.item(pixel), self.normal_y.item(pixel)
+
+
+class PocketMap:
+    def __init__(self, labels, clearance, positions):
+        self.labels = labels
+        self.clearance = clearance
+        self.positions = positions
+        self.width, self.height = labels.shape
+
+    @classmethod
+    def build(cls, surface, positions, max_distance=MAX_DISTANCE):
+        goal = ~white_mask(surface)
+        x, y = np.indices(goal.shape)
+        squared = np.stack([(x - px) ** 2 + (y - py) ** 2 for px, py in positions])
+        labels = np.where(goal, squared.argmin(axis=0) + 1, 0).astype(np.uint8)
+        return cls(labels, distance_to(goal, max_distance).astype(np.float32), positions)
+
+    @classmethod
+    def load(cls, path, positions, max_distance=MAX_DISTANCE):
+        def build(surface):
+            pocket_map = cls.build(surface, positions, max_distance)
+            return {"labels": pocket_map.labels, "clearance": pocket_map.clearance}
+        key = hashlib.sha1(repr(positions).encode()).hexdigest()[:12]
+        arrays = load_cached(path, f"pocket_map_{key}_{max_distance}", build)
+        return cls(arrays["labels"], arrays["clearance"], positions)
+
+    def clearance_at(self, x, y):
+        return self.clearance.item(min(max(int(x), 0), self.width - 1), min(max(int(y), 0), self.height - 1))
+
+    def pockets_at(self, x, y):
+        ix = np.clip(np.asarray(x, dtype=np.float64).astype(np.int64), 0, self.width - 1)
+        iy = np.clip(np.asarray(y, dtype=np.float64).astype(np.int64), 0, self.height - 1)
+        return self.labels[ix, iy]
+
+    def position(self, pocket):
+        return self.positions[pocket - 1]
+
+
+class HitMap:
+    # A colour-coded clickbox compiled into region ids, with names[id]
+    # naming each region and 0 for none. Only fully opaque pixels of a
+    # region's colour count, as with get_at(...) == colour.
+    def __init__(self, regions, names):
+        self.regions = regions
+        self.names = names
+        self.width, self.height = regions.shape
+
+    @classmethod
+    def build(cls, surface, colours):
+        import pygame
+        rgb = pygame.surfarray.array3d(surface)
+        opaque = pygame.surfarray.array_alpha(surface) == 255
+        regions = np.zeros(opaque.shape, dtype=np.uint8)
+        for region, colour in enumerate(colours.values(), 1):
+            regions[opaque & (rgb == colour).all(axis=2)] = region
+        return cls(regions, [None] + list(colours))
+
+    @classmethod
+    def load(cls, path, colours):
+        def build(surface):
+            return {"regions": cls.build(surface, colours).regions}
+        # Region ids follow the order of colours, so the key must too.
+        key = hashlib.sha1(repr(list(colours.items())).encode()).hexdigest()[:12]
+        arrays = load_cached(path, f"hit_map_{key}", build)
+        return cls(arrays["regions"], [None] + list(colours))
+
+    def region_at(self, x, y):
+        return self.names[self.regions.item(min(max(int(x), 0), self.width - 1), min(max(int(y), 0), self.height - 1))]
+
+
+class Pointer:
+    # The cursor's region in every hit map, looked up again only when a
+    # mouse event moves it instead of once per query every frame.
+    def __init__(self, hitmaps, position=(0, 0)):
+        self.hitmaps = hitmaps
+        self.position = None
+        self.regions = {}
+        self.lookups = 0
+        self.move(position)
+
+    def move(self, position):
+        if position != self.position:
+            self.position = position
+            self.regions = {name: hitmap.region_at(*position) for name, hitmap in self.hitmaps.items()}
+            self.lookups += 1
+
+    def handle(self, event):
+        import pygame
+        if event.type in (pygame.MOUSEMOTION, pygame.MOUSEBUTTONUP):
+            self.move(event.pos)
+
+    def over(self, hitmap, region):
+        return self.regions[hitmap] == region
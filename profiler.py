@@ -0,0 +1,132 @@
+import pygame
+import csv
+import json
+import time
+from collections import deque
+
+
+class Section:
+    __slots__ = ("samples", "start")
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self.start)
+        return False
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class FrameProfiler:
+    # Scoped timers and per-frame counters, each kept over the last window
+    # frames. Sections nest, so a stage's time includes its children.
+    def __init__(self, window=600):
+        self.window = window
+        self.sections = {}
+        self.samples = {}
+        self.counts = {}
+        self.frame_counts = {}
+        self.totals = {}
+        self.frames = 0
+        self.overlay = False
+        self.overlay_interval = 250
+        self.overlay_image = None
+        self.overlay_time = 0
+        self.font = None
+
+    def section(self, name):
+        section = self.sections.get(name)
+        if section is None:
+            self.samples[name] = deque(maxlen=self.window)
+            section = self.sections[name] = Section(self.samples[name])
+        return section
+
+    def count(self, name, n=1):
+        self.frame_counts[name] = self.frame_counts.get(name, 0) + n
+
+    def end_frame(self):
+        for name, n in self.frame_counts.items():
+            if name not in self.counts:
+                self.counts[name] = deque(maxlen=self.window)
+            self.totals[name] = self.totals.get(name, 0) + n
+        for name, counts in self.counts.items():
+            counts.append(self.frame_counts.get(name, 0))
+        self.frame_counts = {}
+        self.frames += 1
+
+    def stats(self, name):
+        ordered = sorted(self.samples.get(name) or self.counts.get(name) or ())
+        return {
+            "samples": len(ordered),
+            "mean": sum(ordered) / len(ordered) if ordered else 0,
+            "p50": percentile(ordered, 0.5),
+            "p95": percentile(ordered, 0.95),
+            "p99": percentile(ordered, 0.99),
+            "max": ordered[-1] if ordered else 0,
+        }
+
+    def toggle(self):
+        self.overlay = not self.overlay
+        self.overlay_image = None
+
+    def overlay_lines(self):
+        lines = []
+        for name in ("frame", "physics", "collisions", "render", "aim assist"):
+            if name in self.samples:
+                stats = self.stats(name)
+                lines.append(f"{name:<10} {stats['p50'] * 1000:6.2f} {stats['p95'] * 1000:6.2f} {stats['p99'] * 1000:6.2f} ms")
+        for name in ("blits", "pixels", "asset loads", "layer redraws", "physics steps"):
+            if name in self.counts:
+                lines.append(f"{name:<10} {self.counts[name][-1]:>8} this frame, {self.totals[name]} total")
+        return lines
+
+    def draw(self, screen):
+        if not self.overlay:
+            return
+        current_time = pygame.time.get_ticks()
+        if self.overlay_image is None or current_time - self.overlay_time >= self.overlay_interval:
+            if self.font is None:
+                self.font = pygame.font.SysFont("consolas,dejavusansmono,couriernew,monospace", 13)
+            lines = ["           p50    p95    p99"] + self.overlay_lines()
+            images = [self.font.render(line, True, (255, 255, 255)) for line in lines]
+            width = max(image.get_width() for image in images) + 8
+            height = sum(image.get_height() for image in images) + 8
+            self.overlay_image = pygame.Surface((width, height), pygame.SRCALPHA)
+            self.overlay_image.fill((0, 0, 0, 170))
+            y = 4
+            for image in images:
+                self.overlay_image.blit(image, (4, y))
+                y += image.get_height()
+            self.overlay_time = current_time
+        screen.blit(self.overlay_image, (4, 4))
+
+    def summary(self):
+        rows = []
+        for name in self.samples:
+            stats = self.stats(name)
+            rows.append({"name": name, "unit": "ms", "samples": stats["samples"], **{key: stats[key] * 1000 for key in ("mean", "p50", "p95", "p99", "max")}})
+        for name in self.counts:
+            stats = self.stats(name)
+            rows.append({"name": name, "unit": "per frame", "samples": stats["samples"], **{key: stats[key] for key in ("mean", "p50", "p95", "p99", "max")}})
+        return rows
+
+    def dump(self, path):
+        rows = self.summary()
+        if path.endswith(".json"):
+            with open(path, "w") as file:
+                json.dump({"frames": self.frames, "window": self.window, "totals": self.totals, "sections": rows}, file, indent=2)
+        else:
+            with open(path, "w", newline="") as file:
+                writer = csv.DictWriter(file, ["name", "unit", "samples", "mean", "p50", "p95", "p99", "max"])
+                writer.writeheader()
+                writer.writerows(rows)
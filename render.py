@@ -0,0 +1,166 @@
+import pygame
+
+
+class DirtyRenderer:
+    # Drawing code blits into this instead of the screen. Blits are only
+    # recorded; at the end of the frame the renderer compares them with
+    # the previous frame, restores the regions that changed from the
+    # background, redraws whatever overlaps them in order, and pushes just
+    # those regions to the display.
+    def __init__(self, screen, background):
+        self.screen = screen
+        self.background = background
+        self.previous = []
+        self.current = []
+        self.full = True
+        self.rects = []
+        self.pixels = 0
+        self.blits = 0
+        self.frames = 0
+        self.changed_frames = 0
+        self.total_pixels = 0
+
+    def blit(self, surface, dest, area=None, special_flags=0):
+        rect, area = draw_rect(surface, dest, area)
+        self.current.append((surface, rect, area, special_flags))
+        return rect
+
+    def get_width(self):
+        return self.screen.get_width()
+
+    def get_height(self):
+        return self.screen.get_height()
+
+    def invalidate(self):
+        self.full = True
+
+    def dirty_rects(self):
+        if self.full:
+            return [self.screen.get_rect()]
+        previous = {}
+        for draw in self.previous:
+            key = draw_key(draw)
+            previous[key] = previous.get(key, 0) + 1
+        rects = []
+        for draw in self.current:
+            key = draw_key(draw)
+            if previous.get(key):
+                previous[key] -= 1
+            else:
+                rects.append(draw[1])
+        for draw in self.previous:
+            key = draw_key(draw)
+            if previous.get(key):
+                previous[key] -= 1
+                rects.append(draw[1])
+        return merge_rects(rects, self.screen.get_rect())
+
+    def present(self):
+        self.rects = self.dirty_rects()
+        self.blits = len(self.rects)
+        for dirty in self.rects:
+            self.screen.set_clip(dirty)
+            self.screen.blit(self.background, dirty, dirty)
+            for surface, rect, area, special_flags in self.current:
+                if rect.colliderect(dirty):
+                    self.screen.blit(surface, rect, area, special_flags)
+                    self.blits += 1
+        self.screen.set_clip(None)
+        if self.rects:
+            pygame.display.update(self.rects)
+            self.changed_frames += 1
+        self.pixels = sum(rect.width * rect.height for rect in self.rects)
+        self.total_pixels += self.pixels
+        self.frames += 1
+        # Holding on to last frame's surfaces keeps their ids from being
+        # reused by new ones, which would hide a change.
+        self.previous = self.current
+        self.current = []
+        self.full = False
+
+
+class Layer:
+    # A retained group of draws. The drawing code runs into an off-screen
+    # surface only when the key describing its inputs changes; every other
+    # frame the last surface goes to the renderer as a single blit, and as
+    # the same surface, so the renderer sees nothing changed. Translucent
+    # layers are kept premultiplied so that sprites' soft edges blend onto
+    # the screen once rather than twice.
+    def __init__(self, name, opaque=False):
+        self.name = name
+        self.opaque = opaque
+        self.key = None
+        self.valid = False
+        self.surface = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.draws = []
+        self.renders = 0
+        self.frames = 0
+
+    def blit(self, surface, dest, area=None):
+        rect, area = draw_rect(surface, dest, area)
+        self.draws.append((surface, rect, area))
+        return rect
+
+    def update(self, key, draw):
+        self.frames += 1
+        if self.valid and key == self.key:
+            return False
+        self.draws = []
+        draw(self)
+        self.key = key
+        self.valid = True
+        self.renders += 1
+        if not self.draws:
+            self.surface = None
+            return True
+        self.rect = self.draws[0][1].unionall([rect for _, rect, _ in self.draws[1:]])
+        if self.opaque:
+            self.surface = pygame.Surface(self.rect.size).convert()
+        else:
+            self.surface = pygame.Surface(self.rect.size, pygame.SRCALPHA)
+        for surface, rect, area in self.draws:
+            rect = rect.move(-self.rect.x, -self.rect.y)
+            if self.opaque or not surface.get_flags() & pygame.SRCALPHA:
+                self.surface.blit(surface, rect, area)
+            else:
+                self.surface.blit(surface.premul_alpha(), rect, area, pygame.BLEND_PREMULTIPLIED)
+        self.draws = []
+        return True
+
+    def draw(self, screen):
+        if self.surface is None:
+            return
+        if self.opaque:
+            screen.blit(self.surface, self.rect.topleft)
+        else:
+            screen.blit(self.surface, self.rect.topleft, None, pygame.BLEND_PREMULTIPLIED)
+
+    def report(self):
+        return f"{self.name} redrawn {self.renders} of {self.frames} frames"
+
+
+def draw_rect(surface, dest, area):
+    if area is None:
+        return pygame.Rect(dest, surface.get_size()), None
+    area = pygame.Rect(area)
+    return pygame.Rect(dest, area.size), area
+
+
+def draw_key(draw):
+    surface, rect, area, special_flags = draw
+    return (id(surface), tuple(rect), None if area is None else tuple(area), special_flags)
+
+
+def merge_rects(rects, bounds):
+    merged = []
+    for rect in rects:
+        rect = rect.clip(bounds)
+        if not rect.width or not rect.height:
+            continue
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
@@ -0,0 +1,184 @@
+import time
+import struct
+import hashlib
+import argparse
+from simulation import PoolSimulation
+
+
+MAGIC = b"APRP"
+VERSION = 2
+
+HEADER = struct.Struct("<4sBBBxQII")
+RECORD = struct.Struct("<IB")
+
+STRIKE = 1
+ACCELERATE = 2
+TURN = 3
+
+PAYLOADS = {
+    STRIKE: struct.Struct("<dd"),
+    ACCELERATE: struct.Struct("<dd"),
+    TURN: struct.Struct(""),
+}
+
+CONTINUOUS = 1
+
+
+class Replay:
+    # A rack seed plus every input that reaches the simulation, stamped
+    # with the simulation tick it was applied at. Strikes and
+    # accelerations act before the step of their tick; turn switches act
+    # after the step that reached it and the removal of the players it
+    # knocked out, which is the order Game runs them in.
+    def __init__(self, player_number, seed, continuous=False):
+        self.player_number = player_number
+        self.seed = seed
+        self.continuous = continuous
+        self.records = []
+        self.final_tick = 0
+        self.acceleration = (0, 0)
+
+    def strike(self, tick, angle, force):
+        self.records.append((tick, STRIKE, (angle, force)))
+
+    def accelerate(self, tick, ax, ay):
+        if (ax, ay) != self.acceleration:
+            self.acceleration = (ax, ay)
+            self.records.append((tick, ACCELERATE, (ax, ay)))
+
+    def turn(self, tick):
+        self.records.append((tick, TURN, ()))
+
+    def save(self, path):
+        records = sorted(self.records, key=lambda record: record[0])
+        chunks = [HEADER.pack(MAGIC, VERSION, self.player_number, CONTINUOUS if self.continuous else 0, self.seed, self.final_tick, len(records))]
+        for tick, kind, values in records:
+            chunks.append(RECORD.pack(tick, kind))
+            chunks.append(PAYLOADS[kind].pack(*values))
+        with open(path, "wb") as file:
+            file.write(b"".join(chunks))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, player_number, flags, seed, final_tick, count = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} replay")
+        replay = cls(player_number, seed, bool(flags & CONTINUOUS))
+        replay.final_tick = final_tick
+        offset = HEADER.size
+        for _ in range(count):
+            tick, kind = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            payload = PAYLOADS[kind]
+            replay.records.append((tick, kind, payload.unpack_from(data, offset)))
+            offset += payload.size
+        return replay
+
+
+class ReplayPlayer:
+    def __init__(self, replay, table=None):
+        self.replay = replay
+        self.sim = PoolSimulation(table)
+        self.sim.continuous = replay.continuous
+        self.sim.rack(replay.player_number, replay.seed)
+        self.next_record = 0
+        self.events = []
+
+    def finished(self):
+        return self.sim.tick >= self.replay.final_tick
+
+    def apply(self, kinds):
+        records = self.replay.records
+        while self.next_record < len(records) and records[self.next_record][0] == self.sim.tick:
+            tick, kind, values = records[self.next_record]
+            if kind not in kinds:
+                break
+            if kind == STRIKE:
+                self.sim.strike(*values)
+            elif kind == ACCELERATE:
+                self.sim.main_ball.ax, self.sim.main_ball.ay = values
+            elif kind == TURN:
+                self.sim.check_turn_switch()
+            self.next_record += 1
+
+    def step(self, n=1):
+        for _ in range(n):
+            if self.finished():
+                return
+            self.apply((STRIKE, ACCELERATE))
+            self.sim.step()
+            self.sim.remove_player()
+            self.apply((TURN,))
+            self.events.extend(self.sim.events)
+            self.sim.events.clear()
+
+    def run(self):
+        while not self.finished():
+            self.step()
+        return self.sim
+
+
+def state_hash(sim):
+    digest = hashlib.sha1(struct.pack("<IB", sim.tick, sim.active_player_index))
+    for ball in sim.balls:
+        digest.update(ball.owner.encode())
+        digest.update(struct.pack("<dddd", ball.x, ball.y, ball.vx, ball.vy))
+    return digest.hexdigest()
+
+
+def play_headless(replay):
+    player = ReplayPlayer(replay)
+    start = time.perf_counter()
+    sim = player.run()
+    elapsed = time.perf_counter() - start
+    winner = sim.players[0] if sim.check_win_con() else None
+    print(f"{sim.tick} steps in {elapsed:.2f} s ({sim.tick / elapsed:.0f} steps/s), winner {winner}, players left {sim.players}, state {state_hash(sim)}")
+    return sim
+
+
+def play_rendered(replay, speed=1.0, fps=60):
+    import pygame
+    from assets import assets
+    from render import DirtyRenderer
+    pygame.init()
+    screen = pygame.display.set_mode((960, 540), pygame.SCALED)
+    pygame.display.set_caption("ANARCHY POOL replay")
+    assets.load(stream=False)
+    renderer = DirtyRenderer(screen, assets[("background", "background")])
+    player = ReplayPlayer(replay)
+    clock = pygame.time.Clock()
+    steps = 0
+    running = True
+    while running and not player.finished():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN:
+                if event.key in (pygame.K_PLUS, pygame.K_EQUALS, pygame.K_KP_PLUS):
+                    speed *= 2
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    speed /= 2
+        steps += speed
+        player.step(int(steps))
+        steps -= int(steps)
+        for ball in player.sim.balls:
+            renderer.blit(assets[(ball.owner, ball.sprite)], (ball.x, ball.y))
+        renderer.present()
+        clock.tick(fps)
+    pygame.quit()
+    return player.sim
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play back an ANARCHY POOL replay.")
+    parser.add_argument("path")
+    parser.add_argument("--render", action="store_true", help="show the replay instead of simulating it as fast as possible")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulation steps per frame when rendering, + and - change it")
+    args = parser.parse_args()
+    replay = Replay.load(args.path)
+    if args.render:
+        play_rendered(replay, args.speed)
+    else:
+        play_headless(replay)
@@ -0,0 +1,97 @@
+import pygame
+import time
+
+
+class FrameScheduler:
+    # Ticks at the full frame rate while something moves or animates and
+    # otherwise sleeps in pygame.event.wait until an event arrives or the
+    # next visible change is due, whichever is first.
+    def __init__(self, fps=60, idle_fps=10):
+        self.fps = fps
+        self.idle_fps = idle_fps
+        self.clock = pygame.time.Clock()
+        self.mode = "active"
+        self.stats = {"active": [0, 0, 0], "idle": [0, 0, 0]}
+        self.last_wall = time.perf_counter()
+        self.last_cpu = time.process_time()
+
+    def wait(self, idle=False, timeout=None):
+        self.account()
+        self.mode = "idle" if idle else "active"
+        if not idle:
+            self.clock.tick(self.fps)
+            return
+        limit = 1000 // self.idle_fps
+        timeout = limit if timeout is None else max(min(timeout, limit), 1)
+        event = pygame.event.wait(timeout)
+        if event.type != pygame.NOEVENT:
+            pygame.event.post(event)
+        self.clock.tick()
+
+    def account(self):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        stats = self.stats[self.mode]
+        stats[0] += wall - self.last_wall
+        stats[1] += cpu - self.last_cpu
+        stats[2] += 1
+        self.last_wall = wall
+        self.last_cpu = cpu
+
+    def cpu_per_second(self, mode):
+        wall, cpu, _ = self.stats[mode]
+        return cpu / wall if wall else 0
+
+    def report(self):
+        self.account()
+        parts = []
+        for mode, (wall, cpu, frames) in self.stats.items():
+            if wall:
+                parts.append(f"{mode} {wall:.1f} s, {frames / wall:.0f} fps, {self.cpu_per_second(mode) * 1000:.0f} ms CPU/s")
+        return "frames: " + "; ".join(parts)
+
+
+class FixedTimestep:
+    # Physics steps at a fixed rate of real time whatever the frame rate:
+    # each frame runs the steps that came due since the last, at most
+    # max_steps, and drops the rest so that a slow frame cannot snowball
+    # into slower ones. What is left over is how far drawing should be
+    # between the last two steps.
+    def __init__(self, rate=60, max_steps=4):
+        self.step_time = 1 / rate
+        self.max_steps = max_steps
+        self.accumulator = 0
+        self.last = None
+        self.steps = 0
+        self.frames = 0
+        self.dropped = 0
+        self.clamped_frames = 0
+
+    def reset(self):
+        # Nothing moved since the last step, so the time until the next
+        # frame is not owed to the simulation.
+        self.last = None
+        self.accumulator = 0
+
+    def advance(self, now=None):
+        now = time.perf_counter() if now is None else now
+        # A frame after a reset takes one step straight away, as every
+        # frame used to.
+        self.accumulator += self.step_time if self.last is None else now - self.last
+        self.last = now
+        steps = int(self.accumulator / self.step_time)
+        if steps > self.max_steps:
+            self.dropped += steps - self.max_steps
+            self.clamped_frames += 1
+            steps = self.max_steps
+            self.accumulator = self.accumulator % self.step_time + steps * self.step_time
+        self.accumulator -= steps * self.step_time
+        self.steps += steps
+        self.frames += 1
+        return steps
+
+    def alpha(self):
+        return min(max(self.accumulator / self.step_time, 0), 1)
+
+    def report(self):
+        return f"physics: {self.steps} steps in {self.frames} frames, {self.dropped} dropped in {self.clamped_frames} clamped frames"
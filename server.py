@@ -0,0 +1,520 @@
+import os
+import sys
+import time
+import random
+import struct
+import asyncio
+import argparse
+from math import sqrt, atan2, isfinite
+from collections import deque
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from simulation import PoolSimulation, Ball, MainBall, FunBall, REST_THRESHOLD
+from profiler import percentile
+
+
+# Every message is a type byte and a payload length, then the payload.
+MESSAGE = struct.Struct("<BH")
+
+JOIN = 1
+STRIKE = 2
+WELCOME = 16
+STATE = 17
+GAME_OVER = 18
+
+PAYLOADS = {
+    JOIN: struct.Struct("<B"),
+    STRIKE: struct.Struct("<dd"),
+    WELCOME: struct.Struct("<IBBQ"),
+    GAME_OVER: struct.Struct("<BI"),
+}
+
+# A state is a header and one record per ball that changed since the
+# previous state. Positions are sent in 1/QUANTUM pixel units, as a delta
+# to the last sent value or absolute the first time a ball is sent.
+STATE_HEADER = struct.Struct("<IHBBBB")
+DELTA = struct.Struct("<Bhh")
+ABSOLUTE = struct.Struct("<BHH")
+REMOVED = struct.Struct("<B")
+
+ABSOLUTE_FLAG = 0x40
+REMOVED_FLAG = 0x80
+SLOT_MASK = 0x3f
+
+READY = 1
+BOMB = 2
+
+QUANTUM = 8
+
+SEATS = ["player_1", "player_2", "player_3", "player_4"]
+
+
+def pack(kind, payload=b""):
+    return MESSAGE.pack(kind, len(payload)) + payload
+
+
+async def read_message(reader):
+    kind, length = MESSAGE.unpack(await reader.readexactly(MESSAGE.size))
+    return kind, await reader.readexactly(length)
+
+
+class Match:
+    # One table owned by the server. It steps at a fixed tick rate and
+    # applies strikes from the active seat only. It runs the turn rules in
+    # the order Game does each frame: the cue becomes ready once the table
+    # slows down, then remove_player, check_turn_switch and check_win_con,
+    # keeping the turn with the right player as seats drop out.
+    def __init__(self, match_id, player_number, seed, tick_rate=60, max_turns=300, max_force=300, write_limit=1 << 18):
+        self.match_id = match_id
+        self.player_number = player_number
+        self.seed = seed
+        self.tick_rate = tick_rate
+        self.max_turns = max_turns
+        self.max_force = max_force
+        self.write_limit = write_limit
+        self.sim = PoolSimulation()
+        self.sim.continuous = True
+        self.sim.rack(player_number, seed)
+        self.clients = {}
+        self.known = {}
+        self.pending = None
+        self.ready = True
+        self.has_stricken = False
+        self.turn_passed = False
+        self.turns = 0
+        self.finished = False
+        self.winner = 0
+        self.tick_times = deque(maxlen=600)
+        self.late_ticks = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.started = None
+        self.ended = None
+
+    def active_seat(self):
+        player = self.sim.active_player()
+        return SEATS.index(player) + 1 if player in SEATS else 0
+
+    def strike(self, seat, angle, force):
+        # Strikes come straight off the wire; a NaN would reach the ball
+        # positions and break encode_state for the whole match.
+        if not (isfinite(angle) and isfinite(force)):
+            return
+        if self.ready and not self.finished and self.pending is None and seat == self.active_seat():
+            self.pending = (angle, min(max(force, 0), self.max_force))
+
+    def forfeit(self, seat):
+        # A seat that disconnects loses its balls and leaves the turn
+        # order right away.
+        self.clients.pop(seat, None)
+        owner = SEATS[seat - 1]
+        self.sim.balls = [ball for ball in self.sim.balls if ball.owner != owner]
+        self.sim.owners.rebuild(self.sim.balls)
+        self.remove_players()
+
+    def remove_players(self):
+        # remove_player leaves active_player_index where it was, which
+        # hands the turn to the wrong player, or to nobody once the index
+        # runs past the end. The player who was due keeps the turn; if
+        # they are out, it passes to the next one still in, and the shot
+        # in flight no longer moves it on when it settles.
+        sim = self.sim
+        before = list(sim.players)
+        sim.remove_player()
+        if sim.players == before or not sim.players:
+            return
+        index = sim.active_player_index
+        active = before[index] if index < len(before) else None
+        if active in sim.players:
+            sim.active_player_index = sim.players.index(active)
+            return
+        following = [player for player in before[index + 1:] + before[:index] if player in sim.players]
+        sim.active_player_index = sim.players.index(following[0]) if following else 0
+        self.turn_passed = True
+
+    def tick(self):
+        sim = self.sim
+        if self.pending:
+            sim.strike(*self.pending)
+            self.pending = None
+            self.ready = False
+            self.has_stricken = True
+            self.turn_passed = False
+        sim.step()
+        sim.events.clear()
+        main_speed = (sim.main_ball.vx ** 2 + sim.main_ball.vy ** 2) ** 0.5
+        if not self.ready and sim.total_speed() < REST_THRESHOLD and main_speed < REST_THRESHOLD:
+            self.ready = True
+        self.remove_players()
+        if len(sim.players) > 1 and self.ready and self.has_stricken:
+            if self.turn_passed:
+                sim.scored_this_turn = False
+            else:
+                sim.check_turn_switch()
+            self.has_stricken = False
+            self.turns += 1
+        if sim.check_win_con():
+            self.finished = True
+            self.winner = SEATS.index(sim.players[0]) + 1
+        elif not sim.players or self.turns >= self.max_turns:
+            self.finished = True
+
+    def encode_state(self):
+        sim = self.sim
+        records = []
+        sent = set()
+        for ball in sim.balls:
+            position = (min(max(round(ball.x * QUANTUM), 0), 0xffff), min(max(round(ball.y * QUANTUM), 0), 0xffff))
+            known = self.known.get(ball.slot)
+            sent.add(ball.slot)
+            if known == position:
+                continue
+            if known is not None and abs(position[0] - known[0]) < 0x8000 and abs(position[1] - known[1]) < 0x8000:
+                records.append(DELTA.pack(ball.slot, position[0] - known[0], position[1] - known[1]))
+            else:
+                records.append(ABSOLUTE.pack(ball.slot | ABSOLUTE_FLAG, *position))
+            self.known[ball.slot] = position
+        for slot in [slot for slot in self.known if slot not in sent]:
+            records.append(REMOVED.pack(slot | REMOVED_FLAG))
+            del self.known[slot]
+        players = sum(1 << (SEATS.index(player)) for player in sim.players if player in SEATS)
+        flags = (READY if self.ready else 0) | (BOMB if sim.bomb_flag else 0)
+        header = STATE_HEADER.pack(sim.tick, self.turns & 0xffff, self.active_seat(), players, flags, len(records))
+        return pack(STATE, header + b"".join(records))
+
+    def broadcast(self, message):
+        # The match cannot wait on one client's socket, so a client that
+        # falls write_limit bytes behind is dropped instead.
+        for seat, writer in list(self.clients.items()):
+            if writer.is_closing() or writer.transport.get_write_buffer_size() > self.write_limit:
+                self.forfeit(seat)
+                writer.close()
+                continue
+            writer.write(message)
+            self.bytes_out += len(message)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        period = 1 / self.tick_rate if self.tick_rate else 0
+        self.started = time.perf_counter()
+        deadline = loop.time()
+        while not self.finished:
+            start = time.perf_counter()
+            self.tick()
+            self.broadcast(self.encode_state())
+            self.tick_times.append(time.perf_counter() - start)
+            deadline += period
+            delay = deadline - loop.time()
+            if period and delay < -period:
+                # Too far behind to catch up without a burst of ticks.
+                self.late_ticks += 1
+                deadline = loop.time()
+            await asyncio.sleep(max(delay, 0))
+        self.ended = time.perf_counter()
+        self.broadcast(pack(GAME_OVER, PAYLOADS[GAME_OVER].pack(self.winner, self.sim.tick)))
+        for writer in self.clients.values():
+            writer.close()
+
+    def report(self):
+        ordered = sorted(self.tick_times)
+        elapsed = ((self.ended or time.perf_counter()) - self.started) if self.started else 0
+        mean = sum(ordered) / len(ordered) if ordered else 0
+        rate = self.bytes_out / elapsed if elapsed else 0
+        winner = SEATS[self.winner - 1] if self.winner else ("unfinished" if self.finished else "playing")
+        return (f"match {self.match_id}: {self.player_number} players, {self.sim.tick} ticks, {self.turns} turns, "
+                f"tick {mean * 1000:.3f} ms mean {percentile(ordered, 0.95) * 1000:.3f} ms p95, {self.late_ticks} late, "
+                f"{rate:.0f} B/s out, {self.bytes_in} B in, {winner}")
+
+
+class PoolServer:
+    # Pairs up clients by the player count they ask for and runs every
+    # match as a task on one event loop.
+    def __init__(self, tick_rate=60, max_turns=300, seed=None, report_interval=10, log=sys.stderr):
+        self.tick_rate = tick_rate
+        self.max_turns = max_turns
+        self.random = random.Random(seed)
+        self.report_interval = report_interval
+        self.log = log
+        self.waiting = {2: [], 3: [], 4: []}
+        self.matches = {}
+        self.finished = []
+        self.next_match_id = 0
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self.handle, host, port)
+        if self.report_interval:
+            asyncio.create_task(self.report_periodically())
+        return self.server.sockets[0].getsockname()[1]
+
+    async def handle(self, reader, writer):
+        try:
+            kind, payload = await read_message(reader)
+            if kind != JOIN:
+                writer.close()
+                return
+            player_number, = PAYLOADS[JOIN].unpack(payload)
+            if player_number not in self.waiting:
+                writer.close()
+                return
+            joined = asyncio.get_running_loop().create_future()
+            self.waiting[player_number].append((writer, joined))
+            if len(self.waiting[player_number]) == player_number:
+                self.start_match(player_number)
+            match, seat = await joined
+            while True:
+                kind, payload = await read_message(reader)
+                match.bytes_in += MESSAGE.size + len(payload)
+                if kind == STRIKE:
+                    match.strike(seat, *PAYLOADS[STRIKE].unpack(payload))
+        except (asyncio.IncompleteReadError, ConnectionError, struct.error):
+            pass
+        for queue in self.waiting.values():
+            queue[:] = [entry for entry in queue if entry[0] is not writer]
+        for match in self.matches.values():
+            for seat, client in list(match.clients.items()):
+                if client is writer:
+                    match.forfeit(seat)
+        writer.close()
+
+    def start_match(self, player_number):
+        match = Match(self.next_match_id, player_number, self.random.getrandbits(64), self.tick_rate, self.max_turns)
+        self.next_match_id += 1
+        self.matches[match.match_id] = match
+        for seat, (writer, joined) in enumerate(self.waiting[player_number], 1):
+            match.clients[seat] = writer
+            writer.write(pack(WELCOME, PAYLOADS[WELCOME].pack(match.match_id, seat, player_number, match.seed)))
+            joined.set_result((match, seat))
+        self.waiting[player_number] = []
+        asyncio.create_task(self.play(match))
+
+    async def play(self, match):
+        try:
+            await match.run()
+        finally:
+            del self.matches[match.match_id]
+            for writer in match.clients.values():
+                writer.close()
+        self.finished.append(match)
+        print(match.report(), file=self.log)
+
+    async def report_periodically(self):
+        while True:
+            await asyncio.sleep(self.report_interval)
+            for match in list(self.matches.values()):
+                print(match.report(), file=self.log)
+
+    def close(self):
+        if self.server:
+            self.server.close()
+
+
+class PoolClient:
+    # The table as a client sees it: ball positions rebuilt from the
+    # server's state records, plus whose turn it is.
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.match_id = None
+        self.seat = 0
+        self.player_number = 0
+        self.seed = None
+        self.balls = {}
+        self.tick = 0
+        self.turn = 0
+        self.active_seat = 0
+        self.players = 0
+        self.flags = 0
+        self.winner = None
+        self.bytes_in = 0
+
+    async def connect(self, host, port, player_number):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        self.writer.write(pack(JOIN, PAYLOADS[JOIN].pack(player_number)))
+        kind, payload = await read_message(self.reader)
+        self.match_id, self.seat, self.player_number, self.seed = PAYLOADS[WELCOME].unpack(payload)
+
+    def my_turn(self):
+        return self.flags & READY and self.active_seat == self.seat and self.winner is None
+
+    def strike(self, angle, force):
+        self.writer.write(pack(STRIKE, PAYLOADS[STRIKE].pack(angle, force)))
+
+    async def receive(self):
+        kind, payload = await read_message(self.reader)
+        self.bytes_in += MESSAGE.size + len(payload)
+        if kind == STATE:
+            self.apply_state(payload)
+        elif kind == GAME_OVER:
+            self.winner, self.tick = PAYLOADS[GAME_OVER].unpack(payload)
+        return kind
+
+    def apply_state(self, payload):
+        self.tick, self.turn, self.active_seat, self.players, self.flags, count = STATE_HEADER.unpack_from(payload)
+        offset = STATE_HEADER.size
+        for _ in range(count):
+            code = payload[offset]
+            slot = code & SLOT_MASK
+            if code & REMOVED_FLAG:
+                del self.balls[slot]
+                offset += REMOVED.size
+            elif code & ABSOLUTE_FLAG:
+                _, x, y = ABSOLUTE.unpack_from(payload, offset)
+                self.balls[slot] = (x, y)
+                offset += ABSOLUTE.size
+            else:
+                _, dx, dy = DELTA.unpack_from(payload, offset)
+                x, y = self.balls[slot]
+                self.balls[slot] = (x + dx, y + dy)
+                offset += DELTA.size
+
+    def position(self, slot):
+        x, y = self.balls[slot]
+        return x / QUANTUM, y / QUANTUM
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+async def play_bot(host, port, player_number, seed=None, min_force=60, max_force=300):
+    # Aims at a random ball of another seat, the way ShotPlanner.sample
+    # does, and strikes once per turn.
+    client = PoolClient()
+    await client.connect(host, port, player_number)
+    rng = random.Random(seed)
+    ownership = PoolSimulation().ball_ownerships[player_number]
+    main_slot = ownership.index(0)
+    struck_turn = None
+    try:
+        while client.winner is None:
+            await client.receive()
+            if client.my_turn() and struck_turn != client.turn:
+                struck_turn = client.turn
+                x, y = client.position(main_slot)
+                targets = [slot for slot in client.balls if ownership[slot] not in (0, client.seat)]
+                if targets:
+                    target_x, target_y = client.position(rng.choice(targets))
+                    angle = atan2(target_y - y, target_x - x) + rng.gauss(0, 0.05)
+                else:
+                    angle = rng.uniform(-3.14159, 3.14159)
+                client.strike(angle, rng.uniform(min_force, max_force))
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    client.close()
+    return client
+
+
+async def play_rendered(host, port, player_number, fps=60, max_force=300, max_distance=150):
+    # A window onto a server match. Aim and power come from the cursor the
+    # way Cue does it, and a click sends the strike.
+    import pygame
+    from assets import assets
+    from render import DirtyRenderer
+    pygame.init()
+    screen = pygame.display.set_mode((960, 540), pygame.SCALED)
+    assets.load(stream=False)
+    renderer = DirtyRenderer(screen, assets[("background", "background")])
+    client = PoolClient()
+    await client.connect(host, port, player_number)
+    pygame.display.set_caption(f"ANARCHY POOL match {client.match_id} as {SEATS[client.seat - 1]}")
+    ownership = PoolSimulation().ball_ownerships[player_number]
+    main_slot = ownership.index(0)
+    sprites = []
+    for slot, owner in enumerate(ownership):
+        kind = MainBall if slot == main_slot else FunBall if owner == 0 else Ball
+        sprites.append(("house" if owner == 0 else SEATS[owner - 1], kind.sprite))
+    radius = Ball("house", 0, 0).radius
+
+    async def receive():
+        try:
+            while client.winner is None:
+                await client.receive()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            client.winner = 0
+
+    receiving = asyncio.create_task(receive())
+    running = True
+    while running and client.winner is None:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.MOUSEBUTTONUP and event.button == 1 and client.my_turn() and main_slot in client.balls:
+                x, y = client.position(main_slot)
+                x_cursor, y_cursor = event.pos
+                distance = min(sqrt((x_cursor - x - radius) ** 2 + (y_cursor - y - radius) ** 2), max_distance)
+                client.strike(atan2(y + radius - y_cursor, x + radius - x_cursor), max_force * distance / max_distance)
+        for slot in sorted(client.balls):
+            renderer.blit(assets[sprites[slot]], client.position(slot))
+        renderer.present()
+        await asyncio.sleep(1 / fps)
+    receiving.cancel()
+    client.close()
+    pygame.quit()
+    if client.winner:
+        print(f"{SEATS[client.winner - 1]} won", file=sys.stderr)
+
+
+async def run_bots(host, port, matches, player_counts, seed=0):
+    tasks = []
+    for i in range(matches):
+        player_number = player_counts[i % len(player_counts)]
+        for seat in range(player_number):
+            tasks.append(asyncio.create_task(play_bot(host, port, player_number, seed + len(tasks))))
+    return await asyncio.gather(*tasks)
+
+
+async def run_local(matches, player_counts, tick_rate, seed=0):
+    # A server and its bots on localhost in one process.
+    server = PoolServer(tick_rate, seed=seed, report_interval=0)
+    port = await server.start()
+    start = time.perf_counter()
+    clients = await run_bots("127.0.0.1", port, matches, player_counts, seed)
+    elapsed = time.perf_counter() - start
+    server.close()
+    ticks = sum(match.sim.tick for match in server.finished)
+    sent = sum(match.bytes_out for match in server.finished)
+    print(f"{len(server.finished)} matches, {ticks} ticks in {elapsed:.1f} s ({ticks / elapsed:.0f} ticks/s), "
+          f"{sent / elapsed:.0f} B/s out, {sum(client.bytes_in for client in clients)} B received by clients", file=sys.stderr)
+    return server
+
+
+async def serve(host, port, tick_rate, max_turns, report_interval):
+    server = PoolServer(tick_rate, max_turns, report_interval=report_interval)
+    port = await server.start(host, port)
+    print(f"serving on {host}:{port} at {tick_rate} ticks/s", file=sys.stderr)
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Host networked ANARCHY POOL matches.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run a match server")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=7777)
+    serve_parser.add_argument("--tick-rate", type=float, default=60, help="simulation steps per second per match, 0 runs as fast as possible")
+    serve_parser.add_argument("--max-turns", type=int, default=300)
+    serve_parser.add_argument("--report-interval", type=float, default=10, help="seconds between match reports")
+    bots_parser = commands.add_parser("bots", help="connect bots to a running server")
+    bots_parser.add_argument("--host", default="127.0.0.1")
+    bots_parser.add_argument("--port", type=int, default=7777)
+    play_parser = commands.add_parser("play", help="join a match on a server in a window")
+    play_parser.add_argument("--host", default="127.0.0.1")
+    play_parser.add_argument("--port", type=int, default=7777)
+    play_parser.add_argument("--players", type=int, choices=[2, 3, 4], default=2)
+    local_parser = commands.add_parser("local", help="run a server and bots together on localhost")
+    local_parser.add_argument("--tick-rate", type=float, default=0, help="simulation steps per second per match, 0 runs as fast as possible")
+    for command in (bots_parser, local_parser):
+        command.add_argument("--matches", type=int, default=4)
+        command.add_argument("--players", type=int, nargs="+", choices=[2, 3, 4], default=[2, 3, 4], help="player counts to cycle through")
+        command.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "serve":
+        asyncio.run(serve(args.host, args.port, args.tick_rate, args.max_turns, args.report_interval))
+    elif args.command == "play":
+        asyncio.run(play_rendered(args.host, args.port, args.players))
+    elif args.command == "bots":
+        asyncio.run(run_bots(args.host, args.port, args.matches, args.players, args.seed))
+    else:
+        asyncio.run(run_local(args.matches, args.players, args.tick_rate, args.seed))
@@ -0,0 +1,735 @@
+from math import sqrt, sin, cos, atan2, log, floor, ceil
+import random
+import copy
+from array import array
+from hitmaps import DistanceField, PocketMap
+
+BALL_SIZE = 24
+
+REST_THRESHOLD = 10
+
+MOTION_THRESHOLD = 0.05
+
+# Rails and pockets are rasters sampled per whole pixel, so a distance
+# read at one point can be off by up to a pixel's diagonal from the one
+# stepping reads a little further along.
+RASTER_MARGIN = sqrt(2)
+
+BALL_OWNERSHIP = {
+    2: [0, 1, 1, 1, 1, 1, 1, 0, 0, 2, 2, 2, 2, 2, 2, 0],
+    3: [0, 1, 1, 1, 1, 2, 2, 2, 0, 2, 3, 3, 3, 3, 0, 0],
+    4: [0, 1, 1, 1, 2, 2, 2, 3, 0, 3, 3, 4, 4, 4, 0, 0],
+}
+
+SNAPSHOT_HEADER = 7
+SNAPSHOT_BALL = 8
+
+GOAL_POSITIONS = [
+    (63, 87),
+    (418, 80),
+    (773,87),
+    (63, 454),
+    (418, 460),
+    (773, 454),
+]
+
+
+class Table:
+    def __init__(self, distance_field, pocket_map):
+        self.distance_field = distance_field
+        self.pocket_map = pocket_map
+        self.goal_positions = pocket_map.positions
+        self.x_main_start, self.y_main_start = (210, 260)
+        self.x_leftmost_ball_start, self.y_leftmost_ball_start = (560, 260)
+        self.offset_extra = 1
+
+    @classmethod
+    def load(cls):
+        if cls not in _loaded_tables:
+            _loaded_tables[cls] = cls(DistanceField.load("background/background_hitbox.png"), PocketMap.load("background/goal_hitbox.png", GOAL_POSITIONS))
+        return _loaded_tables[cls]
+
+    def __reduce_ex__(self, protocol):
+        # The stock table is rebuilt from the hitmap cache on the other
+        # side instead of sending its rasters to every worker process.
+        if _loaded_tables.get(type(self)) is self:
+            return (type(self).load, ())
+        return super().__reduce_ex__(protocol)
+
+
+_loaded_tables = {}
+
+
+
+
+class Snapshot:
+    # Simulation state without the table or any objects: a flat array of
+    # the scalars followed by slot, position, velocity, acceleration and
+    # goal status of every ball still on the table. Snapshots are never
+    # modified, so any number of branches can share one.
+    __slots__ = ("values", "players")
+
+    def __init__(self, values, players):
+        self.values = values
+        self.players = players
+
+
+
+
+class Ball:
+    sprite = "idle"
+
+    def __init__(self, owner, x, y):
+        self.x = x
+        self.y = y
+        self.radius = int(BALL_SIZE/2) + 1
+        self.displacement_ball_collisions = 0
+        self.vx = 0
+        self.vy = 0
+        self.ax = 0
+        self.ay = 0
+        self.mass = 1
+        self.drag = 1/(50*sqrt(self.vx**2 + self.vy**2) + 100)
+        self.damping = 0.5
+        self.dt = 0.1
+        self.acceleration = 30
+        self.goal_status = False
+        self.owner = owner
+
+    def move(self, table):
+        self.accelerate()
+        self.bounce(table, self.x + self.vx * self.dt, self.y + self.vy * self.dt)
+
+    def accelerate(self):
+        self.vx += self.ax * self.dt - self.vx*self.drag
+        self.vy += self.ay * self.dt - self.vy*self.drag
+
+    def bounce(self, table, new_x, new_y, skin=0):
+        field = table.distance_field
+        distance = field.distance_at(new_x + self.radius, new_y + self.radius)
+        if distance < self.radius + skin:
+            normal_x, normal_y = field.normal_at(new_x + self.radius, new_y + self.radius)
+            velocity_normal = self.vx * normal_x + self.vy * normal_y
+            if velocity_normal < 0:
+                self.vx -= (2 - self.damping) * velocity_normal * normal_x
+                self.vy -= (2 - self.damping) * velocity_normal * normal_y
+            if distance < self.radius:
+                new_x += (self.radius - distance) * normal_x
+                new_y += (self.radius - distance) * normal_y
+        self.x = new_x
+        self.y = new_y
+
+    def wall_impact(self, table, remaining, skin):
+        speed = sqrt(self.vx**2 + self.vy**2)
+        if speed == 0:
+            return None
+        field = table.distance_field
+        x = self.x + self.radius
+        y = self.y + self.radius
+        clearance = field.distance_at(x, y) - self.radius
+        if speed * remaining <= clearance - skin:
+            return None
+        t = 0
+        for _ in range(64):
+            if clearance < skin:
+                normal_x, normal_y = field.normal_at(x + self.vx * t, y + self.vy * t)
+                if self.vx * normal_x + self.vy * normal_y < 0:
+                    return t
+                t += skin / speed
+            else:
+                t += (clearance - skin / 2) / speed
+            if t >= remaining:
+                return None
+            clearance = field.distance_at(x + self.vx * t, y + self.vy * t) - self.radius
+        return None
+
+    def ball_impact(self, other_ball, skin, margin=0):
+        dx = (self.x + self.radius) - (other_ball.x + other_ball.radius)
+        dy = (self.y + self.radius) - (other_ball.y + other_ball.radius)
+        wx = self.vx - other_ball.vx
+        wy = self.vy - other_ball.vy
+        b = dx * wx + dy * wy
+        if b >= 0:
+            return None
+        reach = self.radius + other_ball.radius + margin
+        c = dx**2 + dy**2 - reach**2
+        if c < 2 * reach * skin:
+            return 0
+        a = wx**2 + wy**2
+        discriminant = b**2 - a * c
+        # Velocities left decaying on a still table underflow long before
+        # they reach zero, and so can a.
+        if discriminant < 0 or a == 0:
+            return None
+        return (-b - sqrt(discriminant)) / a
+
+    def check_collision(self, other_ball, skin=0):
+        dx = (self.x + self.radius) - (other_ball.x + other_ball.radius)
+        dy = (self.y + self.radius) - (other_ball.y + other_ball.radius)
+        distance = sqrt(dx**2 + dy**2)
+        if distance < self.radius + other_ball.radius + skin:
+            normal_x = dx/distance
+            normal_y = dy/distance
+            relative_velocity_x = self.vx - other_ball.vx
+            relative_velocity_y = self.vy - other_ball.vy
+            velocity_normal = (relative_velocity_x * normal_x) + (relative_velocity_y * normal_y)
+            if velocity_normal > 0:
+                return
+            impulse = (2 * velocity_normal) / (self.mass + other_ball.mass)
+            self.vx -= impulse * other_ball.mass * normal_x
+            self.vy -= impulse * other_ball.mass * normal_y
+            other_ball.vx += impulse * self.mass * normal_x
+            other_ball.vy += impulse * self.mass * normal_y
+            self.x += self.displacement_ball_collisions * normal_x
+            self.y += self.displacement_ball_collisions * normal_y
+            other_ball.x -= self.displacement_ball_collisions * normal_x
+            other_ball.y -= self.displacement_ball_collisions * normal_y
+            return True
+
+    def check_goal(self, simulation, pocket):
+        if pocket:
+            self.vx = 0
+            self.vy = 0
+            if self.owner != "house":
+                simulation.events.append({
+                    'type': 'goal',
+                    'coords': (self.x, self.y),
+                    'pocket': pocket,
+                    'owner': self.owner
+                })
+            self.goal_status = True
+
+
+
+
+class MainBall(Ball):
+    sprite = "idle_main"
+
+    def __init__(self, owner, x, y, x_start, y_start):
+        super().__init__(owner, x, y)
+        self.x_start = x_start
+        self.y_start = y_start
+
+    def check_goal(self, simulation, pocket):
+        if pocket:
+            self.vx = 0
+            self.vy = 0
+            self.goal_status = True
+            simulation.events.append({
+                'type': 'teleport',
+                'coords': (self.x + self.radius, self.y + self.radius)
+            })
+            self.x = self.x_start
+            self.y = self.y_start
+
+
+
+
+class FunBall(Ball):
+    sprite = "idle_fun"
+
+    def __init__(self, owner, x, y):
+        super().__init__(owner, x, y)
+        self.mass = 1
+
+    def check_goal(self, simulation, pocket):
+        if pocket:
+            self.vx = 0
+            self.vy = 0
+            self.goal_status = True
+            simulation.arm_bomb(*simulation.centroid())
+
+
+
+
+class OwnerIndex:
+    # Balls left per owner and the sorted players who still have some,
+    # updated as balls leave the table instead of rescanning every ball.
+    def __init__(self):
+        self.counts = {}
+        self.players = []
+
+    def rebuild(self, balls):
+        self.counts = {}
+        for ball in balls:
+            self.counts[ball.owner] = self.counts.get(ball.owner, 0) + 1
+        self.players = sorted(owner for owner in self.counts if owner != "house")
+
+    def remove(self, ball):
+        self.counts[ball.owner] -= 1
+        if self.counts[ball.owner] == 0 and ball.owner != "house":
+            self.players.remove(ball.owner)
+
+    def count(self, owner):
+        return self.counts.get(owner, 0)
+
+    def copy(self):
+        other = OwnerIndex()
+        other.counts = dict(self.counts)
+        other.players = list(self.players)
+        return other
+
+
+
+
+class PoolSimulation:
+    def __init__(self, table=None, backend="python"):
+        self.table = table if table is not None else Table.load()
+        self.backend = backend
+        self.arrays = None
+        self.players_start = ["player_1", "player_2", "player_3", "player_4", "house"]
+        self.players = self.players_start
+        self.player_number = 0
+        self.seed = None
+        self.ball_ownerships = BALL_OWNERSHIP
+        self.ball_ownership = []
+        self.roster = []
+        self.balls = []
+        self.owners = OwnerIndex()
+        self.pocket_listeners = []
+        self.collision_listeners = []
+        self.main_ball = None
+        self.active_player_index = 0
+        self.scored_this_turn = False
+
+        self.bomb_flag = False
+        self.bomb_countdown_steps = 90
+        self.bomb_timer = 0
+        self.x_bomb = 0
+        self.y_bomb = 0
+        self.explosion_radius = 300
+        self.explosion_force = 200
+
+        self.broad_phase = True
+        self.pair_tests = 0
+
+        self.continuous = False
+        self.contact_skin = 0.5
+        self.max_substeps = 32
+        self.substeps = 0
+        self.total_substeps = 0
+
+        self.events = []
+        self.tick = 0
+        self.profiler = None
+
+    def rack(self, player_number, seed=None):
+        self.player_number = player_number
+        self.seed = seed
+        self.tick = 0
+        self.players = self.players_start
+        self.balls = []
+        self.active_player_index = 0
+        self.scored_this_turn = False
+        self.bomb_flag = False
+        table = self.table
+        r = BALL_SIZE/2
+        offset_x = 2 * sin(3.1415 / 3) * r
+        offset_y = 2 * cos(3.1415 / 3) * r
+        x1, y1 = (table.x_leftmost_ball_start, table.y_leftmost_ball_start)
+        x2, y2 = (x1 + offset_x + table.offset_extra, y1 - offset_y - table.offset_extra)
+        x3, y3 = (x1 + offset_x + table.offset_extra, y1 + offset_y + table.offset_extra)
+        x4, y4 = (x1 + 2 * (offset_x + table.offset_extra), y1 - 2 * (offset_y + table.offset_extra))
+        x5, y5 = (x1 + 2 * (offset_x + table.offset_extra), y1 + 2 * (offset_y + table.offset_extra))
+        x6, y6 = (x1 + 2 * (offset_x + table.offset_extra), y1)
+        x7, y7 = (x1 + 3 * (offset_x + table.offset_extra), y1 - (offset_y + table.offset_extra))
+        x8, y8 = (x1 + 3 * (offset_x + table.offset_extra), y1 + (offset_y + table.offset_extra))
+        x9, y9 = (x1 + 3 * (offset_x + table.offset_extra), y1 - 3 * (offset_y + table.offset_extra))
+        x10, y10 = (x1 + 3 * (offset_x + table.offset_extra), y1 + 3 * (offset_y + table.offset_extra))
+        x11, y11 = (x1 + 4 * (offset_x + table.offset_extra), y1 + 4 * (offset_y + table.offset_extra))
+        x12, y12 = (x1 + 4 * (offset_x + table.offset_extra), y1 + 2 * (offset_y + table.offset_extra))
+        x13, y13 = (x1 + 4 * (offset_x + table.offset_extra), y1 - 4 * (offset_y + table.offset_extra))
+        x14, y14 = (x1 + 4 * (offset_x + table.offset_extra), y1 - 2 * (offset_y + table.offset_extra))
+        x15, y15 = (x1 + 4 * (offset_x + table.offset_extra), y1)
+        x_list = [x1, x2, x3, x4, x5, x6, x7, x8, x9, x10, x11, x12, x13, x14, x15]
+        y_list = [y1, y2, y3, y4, y5, y6, y7, y8, y9, y10, y11, y12, y13, y14, y15]
+        combined_list = list(zip(x_list, y_list))
+        random.Random(seed).shuffle(combined_list)
+        x_list, y_list = zip(*combined_list)
+        x_list = list(x_list)
+        y_list = list(y_list)
+        self.ball_ownership = self.ball_ownerships[player_number]
+        white_flag = False
+        for i in range(16):
+            if self.ball_ownership[i] != 0:
+                ball = Ball(self.players[self.ball_ownership[i] - 1], x_list[i - 1], y_list[i - 1])
+            elif self.ball_ownership[i] == 0:
+                if not white_flag:
+                    ball = MainBall(self.players[-1], table.x_main_start, table.y_main_start, table.x_main_start, table.y_main_start)
+                    self.main_ball = ball
+                    white_flag = True
+                else:
+                    ball = FunBall(self.players[-1], x_list[i - 1], y_list[i - 1])
+            ball.slot = i
+            self.balls.append(ball)
+        self.roster = list(self.balls)
+        self.owners.rebuild(self.balls)
+        self.remove_player()
+        self.arrays = None
+        if self.backend == "numpy":
+            from vectorized import BallArrays
+            self.bind_arrays(BallArrays(1, len(self.roster)))
+
+    def copy(self):
+        other = copy.copy(self)
+        other.events = []
+        other.profiler = None
+        other.owners = self.owners.copy()
+        other.pocket_listeners = []
+        other.collision_listeners = []
+        other.players = list(self.players)
+        other.roster = [copy.copy(ball) for ball in self.roster]
+        other.balls = [other.roster[ball.slot] for ball in self.balls]
+        other.main_ball = next(ball for ball in other.balls if isinstance(ball, MainBall))
+        if self.arrays is not None:
+            from vectorized import BallArrays
+            other.bind_arrays(BallArrays(1, len(other.roster)))
+        return other
+
+    def bind_arrays(self, arrays, table_index=0):
+        self.arrays = arrays
+        self.roster = arrays.bind(self.roster, table_index)
+        self.balls = [self.roster[ball.slot] for ball in self.balls]
+        self.main_ball = next(ball for ball in self.balls if isinstance(ball, MainBall))
+
+    def snapshot(self):
+        values = array('d', (self.tick, self.active_player_index, self.scored_this_turn, self.bomb_flag, self.bomb_timer, self.x_bomb, self.y_bomb))
+        for ball in self.balls:
+            values.extend((ball.slot, ball.x, ball.y, ball.vx, ball.vy, ball.ax, ball.ay, ball.goal_status))
+        return Snapshot(values, tuple(self.players))
+
+    def restore(self, snapshot):
+        # Writes the snapshot back into this simulation's own balls, which
+        # may be a copy of the one that took it.
+        values = snapshot.values
+        self.tick = int(values[0])
+        self.active_player_index = int(values[1])
+        self.scored_this_turn = bool(values[2])
+        self.bomb_flag = bool(values[3])
+        self.bomb_timer = int(values[4])
+        self.x_bomb = values[5]
+        self.y_bomb = values[6]
+        self.players = list(snapshot.players)
+        roster = self.roster
+        balls = []
+        for offset in range(SNAPSHOT_HEADER, len(values), SNAPSHOT_BALL):
+            ball = roster[int(values[offset])]
+            ball.x, ball.y, ball.vx, ball.vy, ball.ax, ball.ay, goal_status = values[offset + 1:offset + SNAPSHOT_BALL]
+            ball.goal_status = bool(goal_status)
+            balls.append(ball)
+        self.balls = balls
+        self.owners.rebuild(balls)
+        self.events = []
+
+    def step(self, n=1):
+        for _ in range(n):
+            self.update_bomb()
+            if self.continuous:
+                self.sweep()
+                self.tick += 1
+            else:
+                self.advance(self.arrays.integrate() if self.arrays is not None else None)
+
+    def advance(self, new_positions=None):
+        self.monitor_balls(new_positions)
+        self.handle_collisions()
+        self.tick += 1
+
+    def sweep(self):
+        # Continuous mode: advance every ball to the earliest wall or ball
+        # contact inside the step, resolve it, and repeat with what is left.
+        for ball in self.balls:
+            ball.accelerate()
+        remaining = self.main_ball.dt
+        self.substeps = 0
+        while remaining > 0:
+            impact = self.time_of_impact(remaining)
+            if impact is None or self.substeps >= self.max_substeps - 1:
+                impact = remaining
+            for ball in self.balls:
+                ball.bounce(self.table, ball.x + ball.vx * impact, ball.y + ball.vy * impact, self.contact_skin)
+            self.handle_collisions(self.contact_skin)
+            self.check_pockets()
+            remaining -= impact
+            self.substeps += 1
+        self.total_substeps += self.substeps
+
+    def time_of_impact(self, remaining):
+        impact = None
+        for ball in self.balls:
+            t = ball.wall_impact(self.table, remaining, self.contact_skin)
+            if t is not None and (impact is None or t < impact):
+                impact = t
+        balls = self.balls
+        reach = 2 * remaining * max((sqrt(ball.vx**2 + ball.vy**2) for ball in balls), default=0)
+        for i, j in self.candidate_pairs(reach + self.contact_skin):
+            t = balls[i].ball_impact(balls[j], self.contact_skin)
+            if t is not None and t < remaining and (impact is None or t < impact):
+                impact = t
+        return impact
+
+    def fast_forward(self, max_steps, threshold=REST_THRESHOLD):
+        # With no input every ball decays by the same factor each step, so
+        # free rolling has a closed form. Jump to the last step before any
+        # ball could reach a rail, a pocket or another ball, or the step at
+        # which the table comes to rest, whichever is first.
+        balls = self.balls
+        dt = self.main_ball.dt
+        drag = self.main_ball.drag
+        if any(ball.ax or ball.ay or ball.drag != drag or ball.dt != dt for ball in balls):
+            return 0
+        total = sum(sqrt(ball.vx**2 + ball.vy**2) for ball in balls)
+        if total < threshold:
+            return 0
+        # Every ball moves along a straight line by v * s, where s grows
+        # to at most reach, so the CCD impact times bound s directly.
+        decay = 1 - drag
+        reach = dt * decay / drag
+        limit = reach
+        skin = self.contact_skin + RASTER_MARGIN
+        for ball in balls:
+            speed = sqrt(ball.vx**2 + ball.vy**2)
+            if speed:
+                # bounce pushes a ball back out of the rail even when it is
+                # already leaving, which wall_impact does not count.
+                if self.table.distance_field.distance_at(ball.x + ball.radius, ball.y + ball.radius) - ball.radius < skin:
+                    return 0
+                # wall_impact marches in strides and reports the first one
+                # that lands inside the skin, up to a skin past the rail.
+                t = ball.wall_impact(self.table, limit, skin)
+                if t is not None:
+                    limit = max(t - skin / speed, 0)
+                clearance = self.table.pocket_map.clearance_at(ball.x + ball.radius, ball.y + ball.radius) - 1 - RASTER_MARGIN
+                limit = min(limit, clearance / speed)
+        # check_collision acts anywhere within the skin, so a pair that
+        # only grazes counts as touching at the reach plus the skin.
+        for i, j in self.candidate_pairs(2 * limit * max(sqrt(ball.vx**2 + ball.vy**2) for ball in balls) + self.contact_skin):
+            t = balls[i].ball_impact(balls[j], self.contact_skin, self.contact_skin)
+            if t is not None and t < limit:
+                limit = t
+        if limit <= 0:
+            return 0
+        bound = 1 - limit * drag / (dt * decay)
+        steps = max_steps if bound <= 0 else floor(log(bound) / log(decay))
+        # The step that brings the table to rest is left to a real step;
+        # the closed form can land either side of the threshold there.
+        steps = min(steps, max_steps, ceil(log(threshold / total) / log(decay)) - 1)
+        if self.bomb_flag:
+            steps = min(steps, self.bomb_timer - 1)
+        if steps < 2:
+            return 0
+        decay_steps = decay ** steps
+        travel = dt * decay * (1 - decay_steps) / drag
+        for ball in balls:
+            ball.x += ball.vx * travel
+            ball.y += ball.vy * travel
+            ball.vx *= decay_steps
+            ball.vy *= decay_steps
+        self.bomb_timer -= steps
+        self.tick += steps
+        return steps
+
+    def update_bomb(self):
+        if self.bomb_flag:
+            self.bomb_timer -= 1
+            if self.bomb_timer <= 0:
+                self.explosion()
+
+    def monitor_balls(self, new_positions=None):
+        for ball in self.balls:
+            if new_positions is None:
+                ball.move(self.table)
+            else:
+                ball.bounce(self.table, new_positions[0][ball._row], new_positions[1][ball._row])
+        self.check_pockets()
+
+    def check_pockets(self):
+        pockets = self.table.pocket_map.pockets_at([ball.x + ball.radius for ball in self.balls], [ball.y + ball.radius for ball in self.balls])
+        pocketed = []
+        for ball, pocket in zip(self.balls, pockets.tolist()):
+            ball.check_goal(self, pocket)
+            if pocket:
+                pocketed.append((ball, pocket))
+            try:
+                if (ball.goal_status) and (not isinstance(ball, MainBall)) and (ball.owner != self.players[self.active_player_index]):
+                    self.scored_this_turn = True
+            except IndexError:
+                pass
+        if pocketed:
+            self.balls = [ball for ball in self.balls if not ball.goal_status or isinstance(ball, MainBall)]
+            for ball, pocket in pocketed:
+                if not isinstance(ball, MainBall):
+                    self.owners.remove(ball)
+                for listener in self.pocket_listeners:
+                    listener(ball, pocket)
+
+    def on_pocket(self, listener):
+        # listener(ball, pocket) runs for every ball that drops, the cue
+        # ball included, once the owner index has caught up.
+        self.pocket_listeners.append(listener)
+
+    def on_collision(self, listener):
+        # listener(ball, other_ball) runs for every pair that exchanges an
+        # impulse, right after it, while both balls sit at the contact.
+        self.collision_listeners.append(listener)
+
+    def centroid(self):
+        x_sum = 0
+        y_sum = 0
+        for ball in self.balls:
+            x_sum += ball.x
+            y_sum += ball.y
+        return x_sum / len(self.balls), y_sum / len(self.balls)
+
+    def handle_collisions(self, skin=0):
+        if self.profiler:
+            with self.profiler.section("collisions"):
+                self.resolve_collisions(skin)
+        else:
+            self.resolve_collisions(skin)
+
+    def resolve_collisions(self, skin=0):
+        balls = self.balls
+        if self.broad_phase and not any(ball.displacement_ball_collisions for ball in balls):
+            pairs = self.candidate_pairs(skin)
+        else:
+            pairs = [(i, j) for i in range(len(balls)) for j in range(i + 1, len(balls))]
+        self.pair_tests = len(pairs)
+        listeners = self.collision_listeners
+        for i, j in pairs:
+            if balls[i].check_collision(balls[j], skin) and listeners:
+                for listener in listeners:
+                    listener(balls[i], balls[j])
+
+    def candidate_pairs(self, reach=0):
+        # Balls only overlap if their centres share a cell of one diameter
+        # (plus reach) or sit in neighbouring cells. Sorting keeps the
+        # brute-force resolution order, so results match as long as
+        # collisions do not move balls.
+        balls = self.balls
+        if not balls:
+            return []
+        size = 2 * max(ball.radius for ball in balls) + reach
+        cells = {}
+        for i, ball in enumerate(balls):
+            key = (int((ball.x + ball.radius) // size), int((ball.y + ball.radius) // size))
+            cells.setdefault(key, []).append(i)
+        pairs = []
+        for (cell_x, cell_y), members in cells.items():
+            for a in range(len(members)):
+                for b in range(a + 1, len(members)):
+                    pairs.append((members[a], members[b]))
+            for dx, dy in ((1, -1), (1, 0), (1, 1), (0, 1)):
+                neighbours = cells.get((cell_x + dx, cell_y + dy))
+                if neighbours:
+                    for i in members:
+                        for j in neighbours:
+                            pairs.append((i, j) if i < j else (j, i))
+        pairs.sort()
+        return pairs
+
+    def arm_bomb(self, x_bomb, y_bomb):
+        self.x_bomb = x_bomb
+        self.y_bomb = y_bomb
+        self.bomb_timer = self.bomb_countdown_steps
+        self.bomb_flag = True
+        self.events.append({'type': 'bomb', 'coords': (x_bomb, y_bomb)})
+
+    def explosion(self):
+        for ball in self.balls:
+            distance_x = ball.x - self.x_bomb
+            distance_y = ball.y - self.y_bomb
+            distance = (distance_x ** 2 + distance_y ** 2) ** 0.5
+            if distance < self.explosion_radius:
+                force = self.explosion_force * (1 - distance / self.explosion_radius)
+                angle = atan2(distance_y, distance_x)
+                ball.vx += force * cos(angle) / ball.mass
+                ball.vy += force * sin(angle) / ball.mass
+        self.bomb_flag = False
+        self.events.append({'type': 'explosion', 'coords': (self.x_bomb, self.y_bomb)})
+
+    def strike(self, angle, force):
+        self.main_ball.vx = force*cos(angle)
+        self.main_ball.vy = force*sin(angle)
+        self.events.append({'type': 'strike', 'tick': self.tick, 'angle': angle, 'force': force})
+
+    def total_speed(self):
+        total_v = 0
+        for ball in self.balls:
+            total_v += sqrt(ball.vx**2 + ball.vy**2)
+        return total_v
+
+    def at_rest(self, threshold=REST_THRESHOLD):
+        main_ball_v = sqrt(self.main_ball.vx**2 + self.main_ball.vy**2)
+        return self.total_speed() < threshold and main_ball_v < threshold and not self.bomb_flag
+
+    def in_motion(self, threshold=MOTION_THRESHOLD):
+        # at_rest lets the turn pass while balls still creep along; this
+        # is whether anything would still visibly move.
+        return self.bomb_flag or any(abs(ball.vx) > threshold or abs(ball.vy) > threshold or ball.ax or ball.ay for ball in self.balls)
+
+    def active_player(self):
+        try:
+            return self.players[self.active_player_index]
+        except IndexError:
+            return None
+
+    def check_turn_switch(self):
+        switched = False
+        if len(self.players) > 1:
+            if not self.scored_this_turn:
+                if self.active_player_index >= (len(self.players)-1):
+                    self.active_player_index = 0
+                else:
+                    self.active_player_index += 1
+                switched = True
+            self.scored_this_turn = False
+        return switched
+
+    def remove_player(self):
+        if self.players != self.owners.players:
+            self.players = list(self.owners.players)
+
+    def check_win_con(self):
+        return len(self.players) == 1
+
+
+def simulate_shot(state, angle, force, max_steps=10000, fast_forward=True, in_place=False):
+    # Plays one shot on a copy of state until the table is at rest and
+    # applies the turn rules the game runs once the cue is ready again.
+    # With in_place the shot is played on state itself, for searches that
+    # restore a snapshot into one scratch simulation per candidate.
+    start_tick = state.tick
+    start_players = list(state.players)
+    sim = state if in_place else state.copy()
+    player = sim.active_player()
+    sim.strike(angle, force)
+    events = []
+    next_jump = 0
+    while sim.tick - start_tick < max_steps:
+        skipped = 0
+        if fast_forward and sim.tick >= next_jump:
+            skipped = sim.fast_forward(max_steps - (sim.tick - start_tick))
+            if not skipped:
+                next_jump = sim.tick + 4
+        if not skipped:
+            sim.step()
+        events.extend(sim.events)
+        sim.events.clear()
+        sim.remove_player()
+        if sim.at_rest():
+            break
+    scored = sim.scored_this_turn
+    switched = sim.check_turn_switch()
+    events.append({
+        'type': 'turn',
+        'player': player,
+        'scored': scored,
+        'switched': switched,
+        'scratch': any(event['type'] == 'teleport' for event in events),
+        'next_player': sim.active_player(),
+        'eliminated': [owner for owner in start_players if owner not in sim.players],
+        'winner': sim.players[0] if sim.check_win_con() else None,
+        'steps': sim.tick - start_tick
+    })
+    return sim, events
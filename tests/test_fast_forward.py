@@ -0,0 +1,34 @@
+import os
+import sys
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from simulation import PoolSimulation, simulate_shot
+
+
+SEEDS = range(40)
+
+
+def play(continuous, seed, fast_forward):
+    rng = random.Random(seed)
+    sim = PoolSimulation()
+    sim.continuous = continuous
+    sim.rack(rng.choice([2, 3, 4]), seed)
+    angle = rng.uniform(-3.14, 3.14)
+    force = rng.uniform(50, 300)
+    return simulate_shot(sim, angle, force, 3000, fast_forward=fast_forward)
+
+
+@pytest.mark.parametrize("continuous", [False, True])
+def test_fast_forward_matches_stepping(continuous):
+    for seed in SEEDS:
+        jumped, jumped_events = play(continuous, seed, True)
+        stepped, stepped_events = play(continuous, seed, False)
+        assert jumped.tick == stepped.tick, seed
+        assert [ball.slot for ball in jumped.balls] == [ball.slot for ball in stepped.balls], seed
+        assert jumped.players == stepped.players, seed
+        assert [(event["type"], event.get("tick")) for event in jumped_events] == [(event["type"], event.get("tick")) for event in stepped_events], seed
+        for a, b in zip(jumped.roster, stepped.roster):
+            assert abs(a.x - b.x) < 1e-3 and abs(a.y - b.y) < 1e-3, seed
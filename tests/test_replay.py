@@ -0,0 +1,63 @@
+import os
+import sys
+import random
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+pygame = pytest.importorskip("pygame")
+
+from ai import ShotPlanner
+from batch import choose_shot
+from replay import Replay, ReplayPlayer, state_hash, TURN
+
+
+def record_game(folder, player_number, seed, steps_per_frame, max_frames=20000):
+    # Bots play through Game's own frame, several steps per frame the way
+    # a slow frame catches up, until someone is knocked out and the turn
+    # has moved on past them.
+    import game as game_module
+    game = game_module.Game(["player_1", "player_2", "player_3", "player_4"], replay_folder=str(folder))
+    game_module.game = game
+    try:
+        game.player_number = game.player_number_init = player_number
+        game.startscreen_flag = False
+        random.seed(seed)
+        game.balls_start()
+        game.timestep.advance = lambda: steps_per_frame
+        planner = ShotPlanner(max_steps=600, seed=seed)
+        eliminated_at = None
+        for _ in range(max_frames):
+            if game.cue.ready_status and not game.cue.has_stricken and not game.win_con:
+                if eliminated_at is not None and game.replay.records[-1][0] > eliminated_at:
+                    break
+                game.cue.angle, game.cue.strike_force = choose_shot(game.sim, planner, 4, planner.max_steps)
+                game.cue.strike(game.sim)
+            game.handle_events()
+            game.get_total_speed()
+            game.check_turn_switch()
+            game.check_win_con()
+            if eliminated_at is None and len(game.sim.players) < player_number:
+                eliminated_at = game.sim.tick
+            if game.win_con and not game.sim.in_motion():
+                break
+        game.save_replay()
+        return game.replay_path, game.sim, eliminated_at
+    finally:
+        game.planning.shutdown(wait=False)
+
+
+def test_replay_reproduces_a_game_with_an_elimination(tmp_path):
+    # The dummy display gives out one scaled window per process, so this
+    # is the only test that builds a Game.
+    path, sim, eliminated_at = record_game(tmp_path, 3, 0, 3)
+    assert eliminated_at is not None
+    replay = Replay.load(path)
+    assert any(kind == TURN and tick >= eliminated_at for tick, kind, _ in replay.records)
+    player = ReplayPlayer(replay)
+    player.run()
+    assert player.sim.players == sim.players
+    assert state_hash(player.sim) == state_hash(sim)
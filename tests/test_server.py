@@ -0,0 +1,52 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from server import Match
+
+
+def settle(match, ticks=50):
+    for _ in range(ticks):
+        match.tick()
+
+
+def test_forfeit_of_the_last_seat_passes_the_turn_on():
+    match = Match(0, 3, 1)
+    match.sim.active_player_index = 2
+    match.forfeit(3)
+    assert match.sim.players == ["player_1", "player_2"]
+    assert match.active_seat() == 1
+    match.strike(1, 0.0, 100)
+    assert match.pending is not None
+    settle(match, 400)
+    assert match.turns == 1
+    assert match.active_seat() == 2
+
+
+def test_forfeit_of_an_earlier_seat_keeps_the_turn():
+    match = Match(0, 3, 1)
+    match.sim.active_player_index = 2
+    match.forfeit(1)
+    match.tick()
+    assert match.sim.players == ["player_2", "player_3"]
+    assert match.active_seat() == 3
+
+
+def test_knocking_yourself_out_while_scoring_passes_the_turn_on():
+    # The last seat pockets an opponent's ball and its own last ball in
+    # one shot: scored_this_turn is set but the shooter is gone.
+    match = Match(0, 3, 1)
+    sim = match.sim
+    sim.active_player_index = 2
+    match.ready = False
+    match.has_stricken = True
+    sim.scored_this_turn = True
+    sim.balls = [ball for ball in sim.balls if ball.owner != "player_3"]
+    sim.owners.rebuild(sim.balls)
+    settle(match)
+    assert sim.players == ["player_1", "player_2"]
+    assert match.turns == 1
+    assert match.active_seat() == 1
+    match.strike(1, 0.0, 100)
+    assert match.pending is not None
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+FIELDS = ["x", "y", "vx", "vy", "ax", "ay", "mass", "drag"]
+
+
+class BallArrays:
+    def __init__(self, batch, n):
+        self.shape = (batch, n)
+        for field in FIELDS:
+            setattr(self, field, np.zeros(self.shape))
+        self.dt = 0.1
+
+    def integrate(self):
+        self.vx += self.ax * self.dt - self.vx * self.drag
+        self.vy += self.ay * self.dt - self.vy * self.drag
+        return self.x + self.vx * self.dt, self.y + self.vy * self.dt
+
+    def bind(self, balls, table_index=0):
+        views = []
+        for i, ball in enumerate(balls):
+            cls = view_class(getattr(type(ball), "ball_class", type(ball)))
+            view = cls.__new__(cls)
+            view.__dict__.update({key: value for key, value in ball.__dict__.items() if key not in FIELDS})
+            view._arrays = self
+            view._row = (table_index, i)
+            for field in FIELDS:
+                getattr(self, field)[table_index, i] = getattr(ball, field)
+            self.dt = ball.dt
+            views.append(view)
+        return views
+
+
+def field_property(field):
+    def get(self):
+        return getattr(self._arrays, field)[self._row]
+
+    def set(self, value):
+        getattr(self._arrays, field)[self._row] = value
+
+    return property(get, set)
+
+
+class BallView:
+    pass
+
+
+for _field in FIELDS:
+    setattr(BallView, _field, field_property(_field))
+
+
+_view_classes = {}
+
+
+def view_class(cls):
+    if cls not in _view_classes:
+        _view_classes[cls] = type(f"{cls.__name__}View", (BallView, cls), {"ball_class": cls})
+    return _view_classes[cls]
+
+
+class SimulationBatch:
+    def __init__(self, simulations):
+        self.simulations = simulations
+        self.arrays = BallArrays(len(simulations), max(len(sim.roster) for sim in simulations))
+        for b, sim in enumerate(simulations):
+            sim.bind_arrays(self.arrays, b)
+
+    def step(self, n=1):
+        for _ in range(n):
+            for sim in self.simulations:
+                sim.update_bomb()
+            new_positions = self.arrays.integrate()
+            for sim in self.simulations:
+                sim.advance(new_positions)